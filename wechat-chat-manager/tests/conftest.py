@@ -3,35 +3,79 @@
 """
 
 import os
-import sys
-import tempfile
 import shutil
+import sqlite3
 from pathlib import Path
+from typing import Iterable
 
+import keyring
+import keyring.backend
+import keyring.errors
 import pytest
 
+from wechat_manager.core import key_extractor
+from wechat_manager.core.storage import EncryptedStorage
+
 
 @pytest.fixture(scope="session", autouse=True)
-def _isolate_app_config():
+def _isolate_app_config(tmp_path_factory: pytest.TempPathFactory):
     """Isolate on-disk config from developer machine.
 
     Tests should not read/write user home config.json.
     """
 
-    tmp_cfg_dir = Path(tempfile.mkdtemp())
+    tmp_cfg_dir = tmp_path_factory.mktemp("wechat_manager_cfg")
     os.environ["WECHAT_MANAGER_CONFIG_DIR"] = str(tmp_cfg_dir)
     try:
         yield
     finally:
+        os.environ.pop("WECHAT_MANAGER_CONFIG_DIR", None)
+
+
+class MemoryKeyring(keyring.backend.KeyringBackend):
+    """In-memory keyring backend so tests never touch the system keyring."""
+
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.store = {}
+
+    def get_password(self, service, username):
+        return self.store.get((service, username))
+
+    def set_password(self, service, username, password):
+        self.store[(service, username)] = password
+
+    def delete_password(self, service, username):
         try:
-            shutil.rmtree(tmp_cfg_dir, ignore_errors=True)
-        finally:
-            os.environ.pop("WECHAT_MANAGER_CONFIG_DIR", None)
+            del self.store[(service, username)]
+        except KeyError:
+            raise keyring.errors.PasswordDeleteError(username) from None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _memory_keyring():
+    """Install the in-memory keyring backend for the whole session."""
+    original = keyring.get_keyring()
+    backend = MemoryKeyring()
+    keyring.set_keyring(backend)
+    try:
+        yield backend
+    finally:
+        keyring.set_keyring(original)
 
 
-# 添加项目根目录到 Python 路径
+@pytest.fixture(autouse=True)
+def _reset_key_cache():
+    """Drop the short-lived keyring lookup cache so tests don't see stale keys."""
+    key_extractor._reset_key_cache()
+    yield
+    key_extractor._reset_key_cache()
+
+
+# 项目根目录（导入路径由 pytest.ini 的 pythonpath 配置）
 PROJECT_ROOT = Path(__file__).parent.parent
-sys.path.insert(0, str(PROJECT_ROOT))
 
 # Mock 数据目录
 MOCK_DATA_DIR = Path(__file__).parent / "mock_data"
@@ -42,44 +86,194 @@ TEST_DB_KEY = "0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef"
 TEST_PASSWORD = "test_password_123"
 
 
-@pytest.fixture
-def mock_data_dir() -> Path:
-    """返回 mock 数据目录路径"""
-    return MOCK_DATA_DIR
+# 模拟微信数据库的测试数据
+CONTACT_ROWS = (
+    ("wxid_test1", "张三", "zhangsan", "同事张三", 1),
+    ("wxid_test2", "李四", None, None, 1),
+    ("wxid_test3", "王五", "wangwu", "同学王五", 1),
+    ("12345@chatroom", "测试群", None, None, 2),
+)
 
+CHATROOM_ROWS = (
+    ("12345@chatroom", "wxid_test1;wxid_test2;wxid_test3"),
+    ("67890@chatroom", "wxid_test1;wxid_test2"),
+)
 
-@pytest.fixture
-def test_db_key() -> str:
-    """返回测试用的数据库密钥"""
-    return TEST_DB_KEY
+MSG_ROWS = (
+    (1, 1, 1, 0, 1704067200, 0, "你好"),
+    (2, 1, 1, 0, 1704067260, 1, "你好啊"),
+    (3, 1, 1, 0, 1704067320, 0, "今天天气不错"),
+    (4, 2, 1, 0, 1704067400, 1, "好的，收到"),
+    (5, 2, 1, 0, 1704067460, 0, "谢谢"),
+)
 
+# 一次性测试数据库无需持久性保证，关闭日志与 fsync
+FAST_PRAGMAS = (
+    "journal_mode=MEMORY",
+    "synchronous=OFF",
+    "locking_mode=EXCLUSIVE",
+    "temp_store=MEMORY",
+)
 
-@pytest.fixture
-def test_password() -> str:
-    """返回测试用的应用密码"""
-    return TEST_PASSWORD
 
+def _save_memory_db(mem: sqlite3.Connection, path: Path) -> None:
+    """将内存数据库一次性写入磁盘文件"""
+    dst = sqlite3.connect(str(path))
+    try:
+        for pragma in FAST_PRAGMAS:
+            dst.execute(f"PRAGMA {pragma}")
+        mem.backup(dst)
+        # WAL 模式写入文件头并持久生效：之后 WeChatDBHandler 的读连接不阻塞写
+        dst.execute("PRAGMA journal_mode=WAL")
+    finally:
+        dst.close()
+        mem.close()
 
-@pytest.fixture
-def temp_dir():
-    """创建临时目录，测试后自动清理"""
-    tmp = tempfile.mkdtemp()
-    yield Path(tmp)
-    shutil.rmtree(tmp, ignore_errors=True)
+
+def create_mock_micromsg(path: Path) -> None:
+    """创建模拟的 MicroMsg.db 数据库"""
+    mem = sqlite3.connect(":memory:")
+    with mem:
+        mem.execute("""CREATE TABLE Contact (
+            UserName TEXT PRIMARY KEY,
+            NickName TEXT,
+            Alias TEXT,
+            Remark TEXT,
+            Type INTEGER
+        )""")
+        mem.execute("""CREATE TABLE ChatRoom (
+            ChatRoomName TEXT PRIMARY KEY,
+            UserNameList TEXT
+        )""")
+        # 插入测试数据
+        mem.executemany("INSERT INTO Contact VALUES (?, ?, ?, ?, ?)", CONTACT_ROWS)
+        mem.executemany("INSERT INTO ChatRoom VALUES (?, ?)", CHATROOM_ROWS)
+    _save_memory_db(mem, path)
+
+
+def create_mock_msg(path: Path, talker_mapping: dict | None = None) -> None:
+    """创建模拟的 MSGn.db 数据库"""
+    # 默认的 talker 映射
+    if talker_mapping is None:
+        talker_mapping = {1: "wxid_test1", 2: "wxid_test2"}
+
+    mem = sqlite3.connect(":memory:")
+    with mem:
+        # MSG 表需要 TalkerId 来关联 Name2Id 表
+        mem.execute("""CREATE TABLE MSG (
+            localId INTEGER PRIMARY KEY,
+            TalkerId INTEGER,
+            Type INTEGER,
+            SubType INTEGER,
+            CreateTime INTEGER,
+            IsSender INTEGER,
+            StrContent TEXT
+        )""")
+        # Name2Id 表用于映射 TalkerId 到 UserName
+        mem.execute("""CREATE TABLE Name2Id (
+            rowId INTEGER PRIMARY KEY,
+            UsrName TEXT
+        )""")
+
+        # 插入 Name2Id 映射数据
+        mem.executemany("INSERT INTO Name2Id VALUES (?, ?)", talker_mapping.items())
+
+        # 插入测试消息
+        mem.executemany("INSERT INTO MSG VALUES (?, ?, ?, ?, ?, ?, ?)", MSG_ROWS)
+    _save_memory_db(mem, path)
+
+
+@pytest.fixture(scope="session")
+def storage_key(tmp_path_factory: pytest.TempPathFactory) -> tuple:
+    """TEST_PASSWORD 的 (salt, 派生密钥)，整个会话只计算一次"""
+    probe_dir = tmp_path_factory.mktemp("storage_key")
+    probe = EncryptedStorage(str(probe_dir), TEST_PASSWORD)
+    return (probe_dir / ".salt").read_bytes(), probe._key
+
+
+@pytest.fixture(scope="session")
+def make_storage(storage_key: tuple):
+    """以缓存的 salt 与派生密钥打开新的 EncryptedStorage，跳过 PBKDF2"""
+    salt, key = storage_key
+
+    def _make(path: Path) -> EncryptedStorage:
+        # 先写入派生密钥所用的 salt，之后仅凭密码也能重新打开该目录
+        path.mkdir(parents=True, exist_ok=True)
+        (path / ".salt").write_bytes(salt)
+        return EncryptedStorage(str(path), TEST_PASSWORD, key=key)
+
+    return _make
+
+
+@pytest.fixture(scope="session")
+def project_manifest() -> frozenset:
+    """项目文件清单（相对 PROJECT_ROOT 的 POSIX 路径），整个会话只遍历一次"""
+    paths = {entry.name for entry in os.scandir(PROJECT_ROOT)}
+    for base, dirs, files in os.walk(PROJECT_ROOT / "wechat_manager"):
+        rel_base = Path(base).relative_to(PROJECT_ROOT)
+        paths.add(rel_base.as_posix())
+        paths.update((rel_base / name).as_posix() for name in dirs + files)
+    return frozenset(paths)
 
 
 @pytest.fixture
-def mock_wechat_dir(temp_dir: Path) -> Path:
-    """创建模拟的微信数据目录结构"""
-    wechat_dir = temp_dir / "WeChat Files" / "wxid_test123456"
-    msg_dir = wechat_dir / "Msg"
+def temp_dir(tmp_path: Path) -> Path:
+    """创建临时目录，由 pytest 统一清理"""
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def _wechat_skeleton(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """构建一次模拟的微信数据目录骨架，供各测试复制"""
+    root = tmp_path_factory.mktemp("wechat_skel")
+    msg_dir = root / "WeChat Files" / "wxid_test123456" / "Msg"
     msg_dir.mkdir(parents=True)
 
     # 创建非空占位文件（新版本验证要求非空）
     (msg_dir / "MicroMsg.db").write_bytes(b"x")
     (msg_dir / "MSG0.db").touch()
 
-    return wechat_dir
+    return root
+
+
+# wechat_tree 中的账号目录（故意乱序，用于验证排序）
+WECHAT_TREE_WXIDS = (
+    "wxid_alpha",
+    "wxid_beta",
+    "wxid_gamma",
+    "wxid_zzz",
+    "wxid_aaa",
+    "wxid_mmm",
+)
+
+
+def _build_wxid_dir(wxid_dir: Path) -> None:
+    msg_dir = wxid_dir / "Msg"
+    os.makedirs(msg_dir, exist_ok=True)
+    (msg_dir / "MicroMsg.db").write_bytes(b"x")
+    (msg_dir / "MSG0.db").touch()
+
+
+def build_wxid_tree(base: Path, names: Iterable[str]) -> None:
+    """在 base 下创建多个 wxid_*/Msg 账号目录"""
+    for name in names:
+        _build_wxid_dir(base / name)
+
+
+@pytest.fixture(scope="session")
+def wechat_tree(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """会话级只读的多账号 WeChat Files 目录，供目录检测测试共享"""
+    wechat_files = tmp_path_factory.mktemp("wechat_tree") / "WeChat Files"
+    build_wxid_tree(wechat_files, WECHAT_TREE_WXIDS)
+    (wechat_files / "wxid_alpha" / "config").mkdir()
+    return wechat_files
+
+
+@pytest.fixture
+def mock_wechat_dir(temp_dir: Path, _wechat_skeleton: Path) -> Path:
+    """创建模拟的微信数据目录结构"""
+    shutil.copytree(_wechat_skeleton / "WeChat Files", temp_dir / "WeChat Files")
+    return temp_dir / "WeChat Files" / "wxid_test123456"
 
 
 @pytest.fixture
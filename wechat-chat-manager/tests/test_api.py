@@ -8,21 +8,42 @@ Tests the FastAPI endpoints for:
 """
 
 import pytest
-from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
 from unittest.mock import patch, MagicMock
 
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
 # Import TestClient from fastapi
 from fastapi.testclient import TestClient
 
 
+VALID_KEY = "0123456789abcdef" * 4  # 64 hex chars
+
+
+@dataclass
+class _AuthState:
+    """Mutable state backing the mock auth routes."""
+
+    password_set: bool = False
+    password_hash: Optional[str] = None
+
+
+@dataclass
+class _WeChatState:
+    """Mutable state backing the mock wechat routes."""
+
+    wechat_dir: Optional[str] = None
+    key_saved: bool = False
+
+
 # Create a separate test client that doesn't require real routes
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_client():
     """Create a test client for the API."""
     # Create a minimal FastAPI app for testing
-    from fastapi import FastAPI
-    from fastapi.responses import JSONResponse
-
     test_app = FastAPI()
 
     @test_app.get("/api/health")
@@ -33,7 +54,8 @@ def test_client():
     async def root():
         return {"message": "WeChat Chat Manager API", "docs": "/docs"}
 
-    return TestClient(test_app)
+    with TestClient(test_app) as client:
+        yield client
 
 
 @pytest.fixture
@@ -66,59 +88,64 @@ class TestRootEndpoint:
         assert "message" in data or "docs" in data
 
 
+@pytest.fixture(scope="class")
+def auth_client():
+    """Create a test client with auth routes."""
+    test_app = FastAPI()
+    test_app.state.auth = _AuthState()
+
+    class PasswordRequest(BaseModel):
+        password: str
+
+    class ChangePasswordRequest(BaseModel):
+        old_password: str
+        new_password: str
+
+    @test_app.get("/api/auth/status")
+    async def auth_status():
+        return {"is_set": test_app.state.auth.password_set}
+
+    @test_app.post("/api/auth/setup")
+    async def setup_password(req: PasswordRequest):
+        state = test_app.state.auth
+        if state.password_set:
+            return JSONResponse(
+                status_code=400, content={"detail": "Password already set"}
+            )
+        if len(req.password) < 4:
+            return JSONResponse(
+                status_code=400, content={"detail": "Password too short"}
+            )
+        state.password_set = True
+        state.password_hash = req.password
+        return {"success": True, "message": "Password set successfully"}
+
+    @test_app.post("/api/auth/login")
+    async def login(req: PasswordRequest):
+        state = test_app.state.auth
+        if not state.password_set:
+            return JSONResponse(status_code=400, content={"detail": "Password not set"})
+        if req.password == state.password_hash:
+            return {"success": True, "message": "Login successful"}
+        return JSONResponse(status_code=401, content={"detail": "Invalid password"})
+
+    with TestClient(test_app) as client:
+        yield client
+
+
 class TestAuthRoutes:
     """Tests for /api/auth/* endpoints."""
 
+    @pytest.fixture(autouse=True)
+    def _reset_auth_state(self, auth_client):
+        """Give every test a fresh password state on the shared app."""
+        auth_client.app.state.auth = _AuthState()
+
     @pytest.fixture
-    def auth_client(self):
-        """Create a test client with auth routes."""
-        from fastapi import FastAPI
-        from fastapi.responses import JSONResponse
-        from pydantic import BaseModel
-
-        test_app = FastAPI()
-
-        # Track state
-        password_set = False
-        password_hash = None
-
-        class PasswordRequest(BaseModel):
-            password: str
-
-        class ChangePasswordRequest(BaseModel):
-            old_password: str
-            new_password: str
-
-        @test_app.get("/api/auth/status")
-        async def auth_status():
-            return {"is_set": password_set}
-
-        @test_app.post("/api/auth/setup")
-        async def setup_password(req: PasswordRequest):
-            nonlocal password_set, password_hash
-            if password_set:
-                return JSONResponse(
-                    status_code=400, content={"detail": "Password already set"}
-                )
-            if len(req.password) < 4:
-                return JSONResponse(
-                    status_code=400, content={"detail": "Password too short"}
-                )
-            password_set = True
-            password_hash = req.password
-            return {"success": True, "message": "Password set successfully"}
-
-        @test_app.post("/api/auth/login")
-        async def login(req: PasswordRequest):
-            if not password_set:
-                return JSONResponse(
-                    status_code=400, content={"detail": "Password not set"}
-                )
-            if req.password == password_hash:
-                return {"success": True, "message": "Login successful"}
-            return JSONResponse(status_code=401, content={"detail": "Invalid password"})
-
-        return TestClient(test_app)
+    def auth_client_with_password(self, auth_client):
+        """Shared auth client with the password already set up."""
+        auth_client.post("/api/auth/setup", json={"password": "test1234"})
+        return auth_client
 
     def test_auth_status_not_set(self, auth_client):
         """Test auth status when no password is set."""
@@ -137,68 +164,62 @@ class TestAuthRoutes:
         response = auth_client.post("/api/auth/setup", json={"password": "abc"})
         assert response.status_code == 400
 
-    def test_login_success(self, auth_client):
+    def test_login_success(self, auth_client_with_password):
         """Test successful login."""
-        # First setup password
-        auth_client.post("/api/auth/setup", json={"password": "test1234"})
-
-        # Then login
-        response = auth_client.post("/api/auth/login", json={"password": "test1234"})
+        response = auth_client_with_password.post(
+            "/api/auth/login", json={"password": "test1234"}
+        )
         assert response.status_code == 200
         assert response.json()["success"] == True
 
-    def test_login_wrong_password(self, auth_client):
+    def test_login_wrong_password(self, auth_client_with_password):
         """Test login with wrong password."""
-        # First setup password
-        auth_client.post("/api/auth/setup", json={"password": "test1234"})
-
-        # Then try wrong password
-        response = auth_client.post("/api/auth/login", json={"password": "wrong"})
+        response = auth_client_with_password.post(
+            "/api/auth/login", json={"password": "wrong"}
+        )
         assert response.status_code == 401
 
 
-class TestWeChatRoutes:
-    """Tests for /api/wechat/* endpoints."""
+@pytest.fixture(scope="class")
+def wechat_client():
+    """Create a test client with wechat routes."""
+    test_app = FastAPI()
+    test_app.state.wechat = _WeChatState()
 
-    @pytest.fixture
-    def wechat_client(self):
-        """Create a test client with wechat routes."""
-        from fastapi import FastAPI
-        from fastapi.responses import JSONResponse
-        from pydantic import BaseModel
-        from typing import Optional, List
+    class SetDirRequest(BaseModel):
+        path: str
 
-        test_app = FastAPI()
+    class ManualKeyRequest(BaseModel):
+        key: str
 
-        # Track state
-        wechat_dir = None
-        key_saved = False
+    @test_app.get("/api/wechat/status")
+    async def wechat_status():
+        return {"running": False}
 
-        class SetDirRequest(BaseModel):
-            path: str
+    @test_app.get("/api/wechat/key/status")
+    async def key_status():
+        return {"is_saved": test_app.state.wechat.key_saved}
 
-        class ManualKeyRequest(BaseModel):
-            key: str
+    @test_app.post("/api/wechat/key/manual")
+    async def set_manual_key(req: ManualKeyRequest):
+        if len(req.key) != 64:
+            return JSONResponse(
+                status_code=400, content={"detail": "Key must be 64 hex chars"}
+            )
+        test_app.state.wechat.key_saved = True
+        return {"success": True, "message": "Key set successfully"}
 
-        @test_app.get("/api/wechat/status")
-        async def wechat_status():
-            return {"running": False}
+    with TestClient(test_app) as client:
+        yield client
 
-        @test_app.get("/api/wechat/key/status")
-        async def key_status():
-            return {"is_saved": key_saved}
 
-        @test_app.post("/api/wechat/key/manual")
-        async def set_manual_key(req: ManualKeyRequest):
-            nonlocal key_saved
-            if len(req.key) != 64:
-                return JSONResponse(
-                    status_code=400, content={"detail": "Key must be 64 hex chars"}
-                )
-            key_saved = True
-            return {"success": True, "message": "Key set successfully"}
+class TestWeChatRoutes:
+    """Tests for /api/wechat/* endpoints."""
 
-        return TestClient(test_app)
+    @pytest.fixture(autouse=True)
+    def _reset_wechat_state(self, wechat_client):
+        """Give every test a fresh key state on the shared app."""
+        wechat_client.app.state.wechat = _WeChatState()
 
     def test_wechat_status(self, wechat_client):
         """Test WeChat running status check."""
@@ -214,8 +235,7 @@ class TestWeChatRoutes:
 
     def test_set_manual_key_valid(self, wechat_client):
         """Test setting a valid manual key."""
-        valid_key = "0123456789abcdef" * 4  # 64 hex chars
-        response = wechat_client.post("/api/wechat/key/manual", json={"key": valid_key})
+        response = wechat_client.post("/api/wechat/key/manual", json={"key": VALID_KEY})
         assert response.status_code == 200
         assert response.json()["success"] == True
 
@@ -227,31 +247,27 @@ class TestWeChatRoutes:
         assert response.status_code == 400
 
 
+@pytest.fixture(scope="class")
+def search_client():
+    """Create a test client with search routes."""
+    test_app = FastAPI()
+
+    @test_app.get("/api/search/")
+    async def search_messages(
+        q: str, contact_id: Optional[str] = None, limit: int = 100
+    ):
+        if not q:
+            return JSONResponse(status_code=400, content={"detail": "Query required"})
+        # Return mock results
+        return {"results": [], "count": 0, "query": q}
+
+    with TestClient(test_app) as client:
+        yield client
+
+
 class TestSearchRoutes:
     """Tests for /api/search/* endpoints."""
 
-    @pytest.fixture
-    def search_client(self):
-        """Create a test client with search routes."""
-        from fastapi import FastAPI
-        from fastapi.responses import JSONResponse
-        from typing import Optional
-
-        test_app = FastAPI()
-
-        @test_app.get("/api/search/")
-        async def search_messages(
-            q: str, contact_id: Optional[str] = None, limit: int = 100
-        ):
-            if not q:
-                return JSONResponse(
-                    status_code=400, content={"detail": "Query required"}
-                )
-            # Return mock results
-            return {"results": [], "count": 0, "query": q}
-
-        return TestClient(test_app)
-
     def test_search_with_query(self, search_client):
         """Test search with a valid query."""
         response = search_client.get("/api/search/?q=hello")
@@ -262,21 +278,137 @@ class TestSearchRoutes:
         assert data["query"] == "hello"
 
 
+@pytest.fixture
+def contacts_client(tmp_path, make_storage):
+    """Create a test client with the real contacts routes over temp storage."""
+    from wechat_manager.api.routes import contacts
+    from wechat_manager.api.routes.dependencies import get_storage
+
+    storage = make_storage(tmp_path / "storage")
+    test_app = FastAPI()
+    test_app.include_router(contacts.router, prefix="/api/contacts")
+    test_app.dependency_overrides[get_storage] = lambda: storage
+
+    with TestClient(test_app) as client:
+        yield client, storage
+
+
+class TestContactsConditionalGet:
+    """Tests for ETag revalidation on /api/contacts/extracted."""
+
+    def test_extracted_not_modified_until_storage_changes(self, contacts_client):
+        """Test that the ETag yields 304 until a stored contact changes it"""
+        from wechat_manager.models.chat import Contact
+
+        client, storage = contacts_client
+        first = client.get("/api/contacts/extracted")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+
+        cached = client.get(
+            "/api/contacts/extracted", headers={"If-None-Match": etag}
+        )
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        storage.store_contact(Contact(id="wxid_etag", username="etag"))
+        changed = client.get(
+            "/api/contacts/extracted", headers={"If-None-Match": etag}
+        )
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert changed.json()["count"] == 1
+
+
+@pytest.fixture
+def dependencies(tmp_path, monkeypatch):
+    """The dependencies module with its default storage path under tmp_path."""
+    from wechat_manager.api.routes import dependencies
+
+    monkeypatch.setattr(dependencies, "DEFAULT_STORAGE_PATH", tmp_path / "storage")
+    dependencies._open_storage.cache_clear()
+    yield dependencies
+    dependencies._open_storage.cache_clear()
+
+
+class TestDependencies:
+    """Tests for the cached route dependencies."""
+
+    def test_storage_shared_and_recreated_after_delete(self, dependencies):
+        """Test that storage is shared but rebuilt if its directory is removed"""
+        import shutil
+        from wechat_manager.models.chat import Contact
+
+        storage = dependencies.get_storage()
+        assert dependencies.get_storage() is storage
+
+        shutil.rmtree(dependencies.DEFAULT_STORAGE_PATH)
+        recreated = dependencies.get_storage()
+
+        assert recreated is not storage
+        assert dependencies.DEFAULT_STORAGE_PATH.is_dir()
+        assert recreated.store_contact(Contact(id="wxid_new", username="new"))
+        assert len(recreated.list_contacts()) == 1
+
+    def test_reset_db_handlers_drops_cached_handler(self, dependencies, tmp_path):
+        """Test that handlers are reused per (account, key) until reset"""
+        wxid_dir = str(tmp_path / "wxid_test")
+        handler = dependencies._build_handler(wxid_dir, VALID_KEY)
+        assert dependencies._build_handler(wxid_dir, VALID_KEY) is handler
+
+        dependencies.reset_db_handlers()
+
+        assert dependencies._build_handler(wxid_dir, VALID_KEY) is not handler
+        dependencies.reset_db_handlers()
+
+    def test_wxid_scan_cached_until_root_changes(
+        self, dependencies, tmp_path, monkeypatch
+    ):
+        """Test that wxid folders are rescanned only when the root's mtime moves"""
+        import os
+        from pathlib import Path
+
+        # One TTL bucket for the whole test
+        monkeypatch.setattr(dependencies, "WXID_SCAN_TTL", 10.0**9)
+        dependencies._scan_wxid_folders.cache_clear()
+
+        root = tmp_path / "WeChat Files"
+        (root / "wxid_first" / "Msg").mkdir(parents=True)
+        (root / "wxid_first" / "Msg" / "MicroMsg.db").write_bytes(b"x")
+
+        scan = dependencies.wechat_dir.get_wxid_folders
+        with patch.object(
+            dependencies.wechat_dir, "get_wxid_folders", wraps=scan
+        ) as scanner:
+            first = dependencies._get_wxid_folders(str(root))
+            assert dependencies._get_wxid_folders(str(root)) == first
+            assert scanner.call_count == 1
+            assert [Path(p).name for p in first] == ["wxid_first"]
+
+            (root / "wxid_second" / "Msg").mkdir(parents=True)
+            (root / "wxid_second" / "Msg" / "MicroMsg.db").write_bytes(b"x")
+            # Make sure the mtime moves even on coarse-timestamp filesystems
+            st = root.stat()
+            os.utime(root, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+            second = dependencies._get_wxid_folders(str(root))
+            assert scanner.call_count == 2
+            assert [Path(p).name for p in second] == ["wxid_first", "wxid_second"]
+
+        dependencies._scan_wxid_folders.cache_clear()
+
+
 class TestProjectStructure:
     """Tests for project structure after API integration."""
 
-    def test_routes_directory_exists(self):
+    def test_routes_directory_exists(self, project_manifest):
         """Test that routes directory exists."""
-        project_root = Path(__file__).parent.parent
-        routes_dir = project_root / "wechat_manager" / "api" / "routes"
-        assert routes_dir.exists()
-        assert routes_dir.is_dir()
+        assert "wechat_manager/api/routes" in project_manifest
 
-    def test_route_modules_exist(self):
+    def test_route_modules_exist(self, project_manifest):
         """Test that all route modules exist."""
-        project_root = Path(__file__).parent.parent
-        routes_dir = project_root / "wechat_manager" / "api" / "routes"
-
         expected_modules = [
             "auth.py",
             "wechat.py",
@@ -289,46 +421,54 @@ class TestProjectStructure:
         ]
 
         for module in expected_modules:
-            module_path = routes_dir / module
-            assert module_path.exists(), f"Missing route module: {module}"
+            assert f"wechat_manager/api/routes/{module}" in project_manifest, (
+                f"Missing route module: {module}"
+            )
 
-    def test_main_exists(self):
+    def test_main_exists(self, project_manifest):
         """Test that main.py exists in api directory."""
-        project_root = Path(__file__).parent.parent
-        main_path = project_root / "wechat_manager" / "api" / "main.py"
-        assert main_path.exists()
+        assert "wechat_manager/api/main.py" in project_manifest
+
+
+@pytest.fixture(scope="session")
+def imported_app():
+    """Import the real app and route modules once for the session."""
+    try:
+        from wechat_manager.api.main import app
+        from wechat_manager.api.routes import (
+            auth,
+            wechat,
+            contacts,
+            mode_a,
+            search,
+            export,
+        )
+    except ImportError as e:
+        pytest.skip(f"Could not import app: {e}")
+
+    return {
+        "app": app,
+        "routes": {
+            "auth": auth,
+            "wechat": wechat,
+            "contacts": contacts,
+            "mode_a": mode_a,
+            "search": search,
+            "export": export,
+        },
+    }
 
 
 class TestAPIIntegration:
     """Integration tests for the actual API (when possible)."""
 
-    def test_import_main_app(self):
+    def test_import_main_app(self, imported_app):
         """Test that main app can be imported."""
-        try:
-            from wechat_manager.api.main import app
-
-            assert app is not None
-            assert app.title == "微信聊天记录管理"
-        except ImportError as e:
-            pytest.skip(f"Could not import app: {e}")
+        app = imported_app["app"]
+        assert app is not None
+        assert app.title == "微信聊天记录管理"
 
-    def test_routes_imported(self):
+    def test_routes_imported(self, imported_app):
         """Test that routes are properly imported."""
-        try:
-            from wechat_manager.api.routes import (
-                auth,
-                wechat,
-                contacts,
-                mode_a,
-                search,
-                export,
-            )
-
-            assert auth.router is not None
-            assert wechat.router is not None
-            assert contacts.router is not None
-            assert mode_a.router is not None
-            assert search.router is not None
-            assert export.router is not None
-        except ImportError as e:
-            pytest.skip(f"Could not import routes: {e}")
+        for name, module in imported_app["routes"].items():
+            assert module.router is not None, f"Missing router in {name}"
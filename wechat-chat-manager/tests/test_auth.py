@@ -3,35 +3,24 @@ Tests for app password authentication module
 """
 
 import pytest
-from unittest.mock import patch, MagicMock
-import keyring
-from wechat_manager.core.auth import AuthManager, SERVICE_NAME, HASH_KEY, SALT_KEY
+from unittest.mock import patch
 
+from wechat_manager.core.auth import (
+    AuthManager,
+    DEFAULT_SCRYPT_N,
+    HASH_KEY,
+    SALT_KEY,
+    SCRYPT_N_ENV,
+    SCRYPT_N_KEY,
+    SERVICE_NAME,
+)
 
-@pytest.fixture
-def mock_keyring():
-    """Mock keyring for testing without accessing system keyring"""
-    storage = {}
-
-    def mock_get(service, key):
-        return storage.get(f"{service}:{key}")
-
-    def mock_set(service, key, value):
-        storage[f"{service}:{key}"] = value
 
-    def mock_delete(service, key):
-        k = f"{service}:{key}"
-        if k in storage:
-            del storage[k]
-        else:
-            raise keyring.errors.PasswordDeleteError()
-
-    with (
-        patch("keyring.get_password", side_effect=mock_get),
-        patch("keyring.set_password", side_effect=mock_set),
-        patch("keyring.delete_password", side_effect=mock_delete),
-    ):
-        yield storage
+@pytest.fixture
+def mock_keyring(_memory_keyring):
+    """Empty in-memory keyring storage for each test"""
+    _memory_keyring.store.clear()
+    return _memory_keyring.store
 
 
 def test_is_password_set_when_not_set(mock_keyring):
@@ -47,9 +36,13 @@ def test_set_password_success(mock_keyring):
 
     assert result is True
     assert auth.is_password_set() is True
-    # Verify both hash and salt are stored
-    assert mock_keyring.get(f"{SERVICE_NAME}:{HASH_KEY}") is not None
-    assert mock_keyring.get(f"{SERVICE_NAME}:{SALT_KEY}") is not None
+    # Cost, salt and hash are stored together in one entry
+    scheme, n, salt, hashed = mock_keyring[(SERVICE_NAME, HASH_KEY)].split("$")
+    assert scheme == "scrypt"
+    assert int(n) == auth.scrypt_n
+    assert len(bytes.fromhex(salt)) == 16
+    assert len(bytes.fromhex(hashed)) == 32
+    assert (SERVICE_NAME, SALT_KEY) not in mock_keyring
 
 
 def test_set_password_twice_fails(mock_keyring):
@@ -121,7 +114,7 @@ def test_password_hash_not_plaintext(mock_keyring):
     password = "test_password_123"
     auth.set_password(password)
 
-    stored_hash = mock_keyring.get(f"{SERVICE_NAME}:{HASH_KEY}")
+    stored_hash = mock_keyring.get((SERVICE_NAME, HASH_KEY))
 
     # Hash should not contain plaintext password
     assert stored_hash != password
@@ -130,48 +123,128 @@ def test_password_hash_not_plaintext(mock_keyring):
 
 def test_different_passwords_different_hashes(mock_keyring):
     """Test that different passwords produce different hashes"""
-    storage1 = {}
-    storage2 = {}
-
-    def mock_get1(service, key):
-        return storage1.get(f"{service}:{key}")
-
-    def mock_set1(service, key, value):
-        storage1[f"{service}:{key}"] = value
-
-    def mock_delete1(service, key):
-        k = f"{service}:{key}"
-        if k in storage1:
-            del storage1[k]
-
-    def mock_get2(service, key):
-        return storage2.get(f"{service}:{key}")
-
-    def mock_set2(service, key, value):
-        storage2[f"{service}:{key}"] = value
-
-    def mock_delete2(service, key):
-        k = f"{service}:{key}"
-        if k in storage2:
-            del storage2[k]
-
-    with (
-        patch("keyring.get_password", side_effect=mock_get1),
-        patch("keyring.set_password", side_effect=mock_set1),
-        patch("keyring.delete_password", side_effect=mock_delete1),
-    ):
-        auth1 = AuthManager()
-        auth1.set_password("password_one")
-        hash1 = storage1.get(f"{SERVICE_NAME}:{HASH_KEY}")
-
-    with (
-        patch("keyring.get_password", side_effect=mock_get2),
-        patch("keyring.set_password", side_effect=mock_set2),
-        patch("keyring.delete_password", side_effect=mock_delete2),
-    ):
-        auth2 = AuthManager()
-        auth2.set_password("password_two")
-        hash2 = storage2.get(f"{SERVICE_NAME}:{HASH_KEY}")
+    auth1 = AuthManager()
+    auth1.set_password("password_one")
+    hash1 = mock_keyring.get((SERVICE_NAME, HASH_KEY))
+
+    mock_keyring.clear()
+
+    auth2 = AuthManager()
+    auth2.set_password("password_two")
+    hash2 = mock_keyring.get((SERVICE_NAME, HASH_KEY))
 
     # Different passwords should produce different hashes
     assert hash1 != hash2
+
+
+def test_verify_password_cached(mock_keyring):
+    """Test that a repeated correct verify skips the scrypt hash"""
+    auth = AuthManager()
+    auth.set_password("cached_password")
+    assert auth.verify_password("cached_password") is True
+
+    with patch.object(auth, "_hash_password", wraps=auth._hash_password) as hasher:
+        assert auth.verify_password("cached_password") is True
+        assert hasher.call_count == 0
+
+        # Wrong passwords are never served from the cache
+        assert auth.verify_password("wrong_password") is False
+        assert hasher.call_count == 1
+
+
+def test_verify_cache_invalidated_by_change(mock_keyring):
+    """Test that the old password stops verifying after a change"""
+    auth = AuthManager()
+    auth.set_password("old_password")
+    assert auth.verify_password("old_password") is True
+
+    assert auth.change_password("old_password", "new_password") is True
+
+    assert auth.verify_password("old_password") is False
+    assert auth.verify_password("new_password") is True
+
+
+def test_hash_upgraded_to_configured_cost(mock_keyring):
+    """Test that a hash stored with another scrypt cost is rehashed on login"""
+    AuthManager(scrypt_n=2**10).set_password("upgrade_password")
+    old_hash = mock_keyring[(SERVICE_NAME, HASH_KEY)]
+    assert old_hash.split("$")[1] == str(2**10)
+
+    auth = AuthManager(scrypt_n=2**11)
+    assert auth.verify_password("wrong_password") is False
+    assert mock_keyring[(SERVICE_NAME, HASH_KEY)] == old_hash
+
+    assert auth.verify_password("upgrade_password") is True
+    new_hash = mock_keyring[(SERVICE_NAME, HASH_KEY)]
+    assert new_hash.split("$")[1] == str(2**11)
+    assert new_hash != old_hash
+    assert auth.verify_password("upgrade_password") is True
+
+
+def test_rehash_skipped_after_concurrent_change(mock_keyring):
+    """Test that a rehash never overwrites a password changed meanwhile"""
+    AuthManager(scrypt_n=2**10).set_password("old_password")
+    auth = AuthManager(scrypt_n=2**11)
+    original_hash = auth._hash_password
+
+    def hash_then_change(password, salt, n=None):
+        # Another request changes the password after this verify read the hash
+        AuthManager(scrypt_n=2**11)._force_set_password("new_password")
+        return original_hash(password, salt, n)
+
+    with patch.object(auth, "_hash_password", side_effect=hash_then_change):
+        assert auth.verify_password("old_password") is True
+    changed_hash = mock_keyring[(SERVICE_NAME, HASH_KEY)]
+
+    assert auth.verify_password("old_password") is False
+    assert auth.verify_password("new_password") is True
+    assert mock_keyring[(SERVICE_NAME, HASH_KEY)] == changed_hash
+
+
+def _store_legacy_hash(mock_keyring, password: str, n=None):
+    """Store a password in the old separate hash/salt/cost layout"""
+    salt = bytes(range(16))
+    hashed = AuthManager(scrypt_n=DEFAULT_SCRYPT_N)._hash_password(password, salt)
+    mock_keyring[(SERVICE_NAME, HASH_KEY)] = hashed.hex()
+    mock_keyring[(SERVICE_NAME, SALT_KEY)] = salt.hex()
+    if n is not None:
+        mock_keyring[(SERVICE_NAME, SCRYPT_N_KEY)] = n
+
+
+def test_legacy_hash_without_stored_cost(mock_keyring):
+    """Test that hashes stored before the cost was recorded still verify"""
+    _store_legacy_hash(mock_keyring, "legacy_password")
+
+    auth = AuthManager(scrypt_n=DEFAULT_SCRYPT_N)
+    assert auth.verify_password("wrong_password") is False
+    assert auth.verify_password("legacy_password") is True
+
+    # Moved to the single-entry layout on the first successful login
+    assert mock_keyring[(SERVICE_NAME, HASH_KEY)].startswith("scrypt$")
+    assert (SERVICE_NAME, SALT_KEY) not in mock_keyring
+    assert auth.verify_password("legacy_password") is True
+
+
+@pytest.mark.parametrize("stored_n", ["not-a-number", "1000", "0"])
+def test_invalid_stored_cost_uses_default(mock_keyring, stored_n):
+    """Test that a damaged stored scrypt cost falls back to the default"""
+    _store_legacy_hash(mock_keyring, "legacy_password", n=stored_n)
+
+    assert AuthManager().verify_password("legacy_password") is True
+
+
+def test_malformed_stored_hash_rejected(mock_keyring):
+    """Test that an unreadable stored hash fails verification cleanly"""
+    mock_keyring[(SERVICE_NAME, HASH_KEY)] = "scrypt$16384$not-hex"
+
+    assert AuthManager().verify_password("any_password") is False
+
+
+def test_scrypt_cost_from_env(monkeypatch):
+    """Test that the scrypt cost can be set through the environment"""
+    monkeypatch.setenv(SCRYPT_N_ENV, str(2**15))
+    assert AuthManager().scrypt_n == 2**15
+
+    # Not a power of two: ignored
+    monkeypatch.setenv(SCRYPT_N_ENV, "1000")
+    assert AuthManager().scrypt_n == DEFAULT_SCRYPT_N
@@ -5,14 +5,16 @@
 import pytest
 from pathlib import Path
 
+from tests.conftest import MOCK_DATA_DIR, TEST_DB_KEY, TEST_PASSWORD
 
-def test_fixtures_available(mock_data_dir, test_db_key, test_password):
-    """测试 fixtures 是否正确加载"""
-    assert mock_data_dir is not None
-    assert isinstance(mock_data_dir, Path)
-    assert test_db_key is not None
-    assert len(test_db_key) == 64  # 32字节 = 64个十六进制字符
-    assert test_password is not None
+
+def test_constants_available():
+    """测试共享测试常量是否正确定义"""
+    assert MOCK_DATA_DIR is not None
+    assert isinstance(MOCK_DATA_DIR, Path)
+    assert TEST_DB_KEY is not None
+    assert len(TEST_DB_KEY) == 64  # 32字节 = 64个十六进制字符
+    assert TEST_PASSWORD is not None
 
 
 def test_temp_dir_fixture(temp_dir):
@@ -29,14 +31,10 @@ def test_mock_wechat_dir_fixture(mock_wechat_dir):
     assert (mock_wechat_dir / "Msg" / "MSG0.db").exists()
 
 
-def test_project_structure():
+def test_project_structure(project_manifest):
     """测试项目结构是否正确"""
-    from pathlib import Path
-
-    project_root = Path(__file__).parent.parent
-
-    assert (project_root / "wechat_manager").exists()
-    assert (project_root / "wechat_manager" / "__init__.py").exists()
-    assert (project_root / "wechat_manager" / "core").exists()
-    assert (project_root / "wechat_manager" / "api").exists()
-    assert (project_root / "requirements.txt").exists()
+    assert "wechat_manager" in project_manifest
+    assert "wechat_manager/__init__.py" in project_manifest
+    assert "wechat_manager/core" in project_manifest
+    assert "wechat_manager/api" in project_manifest
+    assert "requirements.txt" in project_manifest
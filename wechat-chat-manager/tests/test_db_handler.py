@@ -4,90 +4,24 @@ WeChatDBHandler 的测试模块
 遵循 TDD 方法，测试 SQLCipher 数据库解密和读取功能
 """
 
+import os
+import shutil
 import sqlite3
+from operator import attrgetter
 import pytest
 from pathlib import Path
 
 from wechat_manager.core.db_handler import WeChatDBHandler
 from wechat_manager.models.chat import Contact, ChatRoom, Message
+from tests.conftest import TEST_DB_KEY, create_mock_micromsg, create_mock_msg
 
 
-def create_mock_micromsg(path: Path) -> None:
-    """创建模拟的 MicroMsg.db 数据库"""
-    conn = sqlite3.connect(str(path))
-    conn.execute("""CREATE TABLE Contact (
-        UserName TEXT PRIMARY KEY,
-        NickName TEXT,
-        Alias TEXT,
-        Remark TEXT,
-        Type INTEGER
-    )""")
-    conn.execute("""CREATE TABLE ChatRoom (
-        ChatRoomName TEXT PRIMARY KEY,
-        UserNameList TEXT
-    )""")
-    # 插入测试数据
-    conn.execute(
-        "INSERT INTO Contact VALUES ('wxid_test1', '张三', 'zhangsan', '同事张三', 1)"
+@pytest.fixture(scope="session")
+def _db_template_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """构建一次模拟数据库模板目录，供所有测试复制使用"""
+    wechat_dir = (
+        tmp_path_factory.mktemp("wechat_template") / "WeChat Files" / "wxid_testuser"
     )
-    conn.execute("INSERT INTO Contact VALUES ('wxid_test2', '李四', NULL, NULL, 1)")
-    conn.execute(
-        "INSERT INTO Contact VALUES ('wxid_test3', '王五', 'wangwu', '同学王五', 1)"
-    )
-    conn.execute(
-        "INSERT INTO Contact VALUES ('12345@chatroom', '测试群', NULL, NULL, 2)"
-    )
-    conn.execute(
-        "INSERT INTO ChatRoom VALUES ('12345@chatroom', 'wxid_test1;wxid_test2;wxid_test3')"
-    )
-    conn.execute(
-        "INSERT INTO ChatRoom VALUES ('67890@chatroom', 'wxid_test1;wxid_test2')"
-    )
-    conn.commit()
-    conn.close()
-
-
-def create_mock_msg(path: Path, talker_mapping: dict = None) -> None:
-    """创建模拟的 MSGn.db 数据库"""
-    conn = sqlite3.connect(str(path))
-    # MSG 表需要 TalkerId 来关联 Name2Id 表
-    conn.execute("""CREATE TABLE MSG (
-        localId INTEGER PRIMARY KEY,
-        TalkerId INTEGER,
-        Type INTEGER,
-        SubType INTEGER,
-        CreateTime INTEGER,
-        IsSender INTEGER,
-        StrContent TEXT
-    )""")
-    # Name2Id 表用于映射 TalkerId 到 UserName
-    conn.execute("""CREATE TABLE Name2Id (
-        rowId INTEGER PRIMARY KEY,
-        UsrName TEXT
-    )""")
-
-    # 默认的 talker 映射
-    if talker_mapping is None:
-        talker_mapping = {1: "wxid_test1", 2: "wxid_test2"}
-
-    # 插入 Name2Id 映射数据
-    for talker_id, username in talker_mapping.items():
-        conn.execute("INSERT INTO Name2Id VALUES (?, ?)", (talker_id, username))
-
-    # 插入测试消息
-    conn.execute("INSERT INTO MSG VALUES (1, 1, 1, 0, 1704067200, 0, '你好')")
-    conn.execute("INSERT INTO MSG VALUES (2, 1, 1, 0, 1704067260, 1, '你好啊')")
-    conn.execute("INSERT INTO MSG VALUES (3, 1, 1, 0, 1704067320, 0, '今天天气不错')")
-    conn.execute("INSERT INTO MSG VALUES (4, 2, 1, 0, 1704067400, 1, '好的，收到')")
-    conn.execute("INSERT INTO MSG VALUES (5, 2, 1, 0, 1704067460, 0, '谢谢')")
-    conn.commit()
-    conn.close()
-
-
-@pytest.fixture
-def mock_db_wechat_dir(temp_dir: Path) -> Path:
-    """创建带有完整模拟数据库的微信目录结构"""
-    wechat_dir = temp_dir / "WeChat Files" / "wxid_testuser"
     msg_dir = wechat_dir / "Msg"
     msg_dir.mkdir(parents=True)
 
@@ -101,12 +35,29 @@ def mock_db_wechat_dir(temp_dir: Path) -> Path:
     return wechat_dir
 
 
+@pytest.fixture
+def mock_db_wechat_dir(
+    request: pytest.FixtureRequest, tmp_path: Path, _db_template_dir: Path
+) -> Path:
+    """创建带有完整模拟数据库的微信目录结构（从会话模板复制）
+
+    标记为 readonly 的测试直接共享模板，无需复制；其余测试会以读写方式
+    打开数据库（可能在模板旁生成 -wal/-shm 文件），因此使用独立副本。
+    """
+    if request.node.get_closest_marker("readonly"):
+        return _db_template_dir
+
+    clone_root = tmp_path / "wechat_clone"
+    shutil.copytree(_db_template_dir.parent.parent, clone_root)
+    return clone_root / "WeChat Files" / _db_template_dir.name
+
+
 class TestWeChatDBHandler:
     """WeChatDBHandler 测试类"""
 
-    def test_decrypt_mock_db(self, mock_db_wechat_dir: Path, test_db_key: str):
+    def test_decrypt_mock_db(self, mock_db_wechat_dir: Path):
         """测试连接模拟数据库（使用普通 sqlite3 模拟解密场景）"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
 
         # 测试连接 MicroMsg.db
         db_path = mock_db_wechat_dir / "Msg" / "MicroMsg.db"
@@ -114,16 +65,15 @@ class TestWeChatDBHandler:
 
         assert conn is not None
 
-        # 验证能够查询数据
-        cursor = conn.execute("SELECT COUNT(*) FROM Contact")
-        count = cursor.fetchone()[0]
-        assert count > 0
+        # 验证能够查询数据（EXISTS 读到第一行即返回，无需全表计数）
+        cursor = conn.execute("SELECT EXISTS (SELECT 1 FROM Contact)")
+        assert cursor.fetchone()[0] == 1
 
         conn.close()
 
-    def test_read_contacts(self, mock_db_wechat_dir: Path, test_db_key: str):
+    def test_read_contacts(self, mock_db_wechat_dir: Path):
         """测试从 MicroMsg.db 读取联系人"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
         contacts = handler.get_contacts()
 
         # 验证返回的是 Contact 对象列表
@@ -132,20 +82,20 @@ class TestWeChatDBHandler:
         assert all(isinstance(c, Contact) for c in contacts)
 
         # 验证联系人数据
-        usernames = [c.username for c in contacts]
-        assert "wxid_test1" in usernames
-        assert "wxid_test2" in usernames
+        by_user = {c.username: c for c in contacts}
+        assert "wxid_test1" in by_user
+        assert "wxid_test2" in by_user
 
         # 验证具体联系人信息
-        zhangsan = next(c for c in contacts if c.username == "wxid_test1")
+        zhangsan = by_user["wxid_test1"]
         assert zhangsan.nickname == "张三"
         assert zhangsan.alias == "zhangsan"
         assert zhangsan.remark == "同事张三"
         assert zhangsan.contact_type == 1
 
-    def test_read_chatrooms(self, mock_db_wechat_dir: Path, test_db_key: str):
+    def test_read_chatrooms(self, mock_db_wechat_dir: Path):
         """测试从 MicroMsg.db 读取群聊"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
         chatrooms = handler.get_chatrooms()
 
         # 验证返回的是 ChatRoom 对象列表
@@ -154,18 +104,18 @@ class TestWeChatDBHandler:
         assert all(isinstance(cr, ChatRoom) for cr in chatrooms)
 
         # 验证群聊数据
-        room_names = [cr.name for cr in chatrooms]
-        assert "12345@chatroom" in room_names
+        by_name = {cr.name: cr for cr in chatrooms}
+        assert "12345@chatroom" in by_name
 
         # 验证群成员
-        room = next(cr for cr in chatrooms if cr.name == "12345@chatroom")
+        room = by_name["12345@chatroom"]
         assert "wxid_test1" in room.members
         assert "wxid_test2" in room.members
         assert "wxid_test3" in room.members
 
-    def test_read_messages(self, mock_db_wechat_dir: Path, test_db_key: str):
+    def test_read_messages(self, mock_db_wechat_dir: Path):
         """测试从 MSGn.db 读取消息"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
         messages = handler.get_messages("wxid_test1", limit=100)
 
         # 验证返回的是 Message 对象列表
@@ -174,16 +124,18 @@ class TestWeChatDBHandler:
         assert all(isinstance(m, Message) for m in messages)
 
         # 验证消息数据
-        assert any(m.content == "你好" for m in messages)
-        assert any(m.content == "你好啊" for m in messages)
+        by_content = {m.content: m for m in messages}
+        assert "你好" in by_content
+        assert "你好啊" in by_content
 
         # 验证消息属性
-        msg = next(m for m in messages if m.content == "你好")
+        msg = by_content["你好"]
         assert msg.contact_id == "wxid_test1"
         assert msg.is_sender is False
         assert msg.msg_type == 1
         assert msg.create_time == 1704067200
 
+    @pytest.mark.readonly
     def test_invalid_key_rejected(self, mock_db_wechat_dir: Path):
         """测试使用无效密钥被拒绝（仅验证密钥格式）"""
         # 密钥格式验证 - 密钥必须是 64 个十六进制字符
@@ -197,15 +149,13 @@ class TestWeChatDBHandler:
         with pytest.raises(ValueError, match="密钥必须是64个十六进制字符"):
             WeChatDBHandler(str(mock_db_wechat_dir), "zzzz" * 16)
 
-    def test_message_contact_association(
-        self, mock_db_wechat_dir: Path, test_db_key: str
-    ):
+    def test_message_contact_association(self, mock_db_wechat_dir: Path):
         """测试消息与联系人的关联"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
 
         # 获取联系人
         contacts = handler.get_contacts()
-        contact_usernames = {c.username for c in contacts}
+        contact_usernames = set(map(attrgetter("username"), contacts))
 
         # 获取不同联系人的消息
         messages_1 = handler.get_messages("wxid_test1")
@@ -216,15 +166,16 @@ class TestWeChatDBHandler:
         assert all(m.contact_id == "wxid_test2" for m in messages_2)
 
         # 验证消息内容不混淆
-        contents_1 = {m.content for m in messages_1}
-        contents_2 = {m.content for m in messages_2}
+        contents_1 = set(map(attrgetter("content"), messages_1))
+        contents_2 = set(map(attrgetter("content"), messages_2))
 
         assert "你好" in contents_1
         assert "好的，收到" in contents_2
 
-    def test_get_all_msg_databases(self, mock_db_wechat_dir: Path, test_db_key: str):
+    @pytest.mark.readonly
+    def test_get_all_msg_databases(self, mock_db_wechat_dir: Path):
         """测试获取所有 MSG 数据库文件"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
         msg_dbs = handler.get_all_msg_databases()
 
         # 验证返回的是文件路径列表
@@ -236,9 +187,9 @@ class TestWeChatDBHandler:
         assert "MSG0.db" in filenames
         assert "MSG1.db" in filenames
 
-    def test_message_limit(self, mock_db_wechat_dir: Path, test_db_key: str):
+    def test_message_limit(self, mock_db_wechat_dir: Path):
         """测试消息数量限制"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
 
         # 限制为 1 条消息
         messages = handler.get_messages("wxid_test1", limit=1)
@@ -248,12 +199,124 @@ class TestWeChatDBHandler:
         messages = handler.get_messages("wxid_test1", limit=2)
         assert len(messages) == 2
 
-    def test_nonexistent_contact_returns_empty(
-        self, mock_db_wechat_dir: Path, test_db_key: str
-    ):
+    def test_nonexistent_contact_returns_empty(self, mock_db_wechat_dir: Path):
         """测试查询不存在的联系人返回空列表"""
-        handler = WeChatDBHandler(str(mock_db_wechat_dir), test_db_key)
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
         messages = handler.get_messages("wxid_nonexistent")
 
         assert isinstance(messages, list)
         assert len(messages) == 0
+
+    @pytest.mark.readonly
+    def test_snapshot_connection_is_read_only(self, mock_db_wechat_dir: Path):
+        """测试解密副本以只读方式打开"""
+        db_path = mock_db_wechat_dir / "Msg" / "MicroMsg.db"
+        conn = WeChatDBHandler._open_snapshot(str(db_path))
+        try:
+            cursor = conn.execute("SELECT EXISTS (SELECT 1 FROM Contact)")
+            assert cursor.fetchone()[0] == 1
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM Contact")
+        finally:
+            conn.close()
+
+
+@pytest.fixture
+def counting_decrypt(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> list:
+    """把模拟数据库当作加密库处理，并记录每次"解密"的源路径
+
+    解密以 sqlite 备份代替，副本写入 tmp_path，便于检查是否被删除。
+    """
+    calls = []
+
+    def fake_decrypt(key, db_path, output_path=None, version_hint=None):
+        calls.append(db_path)
+        out = tmp_path / f"snapshot_{len(calls)}.db"
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(str(out))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        return str(out)
+
+    monkeypatch.setattr(
+        "wechat_manager.core.db_handler.is_encrypted_database", lambda path: True
+    )
+    monkeypatch.setattr("wechat_manager.core.db_handler.decrypt_database", fake_decrypt)
+    return calls
+
+
+def _add_contact(db_path: Path, username: str) -> None:
+    """向源库追加一个联系人，改变其 (大小, 修改时间) 指纹"""
+    conn = sqlite3.connect(str(db_path))
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO Contact VALUES (?, ?, NULL, NULL, 1)", (username, username)
+            )
+    finally:
+        conn.close()
+
+
+class TestDecryptedSnapshots:
+    """解密副本的复用与替换"""
+
+    def test_second_connect_reuses_snapshot(
+        self, mock_db_wechat_dir: Path, counting_decrypt: list
+    ):
+        """源库未变化时，再次连接复用已解密的副本"""
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
+        db_path = str(mock_db_wechat_dir / "Msg" / "MicroMsg.db")
+
+        handler.connect(db_path).close()
+        handler.connect(db_path).close()
+        handler.get_contacts()
+
+        assert counting_decrypt == [db_path]
+        handler._cleanup_cache()
+
+    def test_source_mtime_change_redecrypts(
+        self, mock_db_wechat_dir: Path, counting_decrypt: list
+    ):
+        """仅修改时间变化 (大小不变) 也会触发重新解密"""
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
+        db_path = mock_db_wechat_dir / "Msg" / "MicroMsg.db"
+
+        handler.connect(str(db_path)).close()
+        st = db_path.stat()
+        os.utime(db_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        handler.connect(str(db_path)).close()
+
+        assert len(counting_decrypt) == 2
+        handler._cleanup_cache()
+
+    def test_source_change_redecrypts_and_keeps_old_copy(
+        self, mock_db_wechat_dir: Path, counting_decrypt: list
+    ):
+        """源库变化后重新解密；旧副本在清理前保留，已打开的连接仍可读"""
+        handler = WeChatDBHandler(str(mock_db_wechat_dir), TEST_DB_KEY)
+        db_path = mock_db_wechat_dir / "Msg" / "MicroMsg.db"
+
+        old_conn = handler.connect(str(db_path))
+        old_copy = handler._decrypted_cache[str(db_path)]
+
+        _add_contact(db_path, "wxid_new")
+        new_conn = handler.connect(str(db_path))
+        try:
+            assert len(counting_decrypt) == 2
+            new_copy = handler._decrypted_cache[str(db_path)]
+            assert new_copy != old_copy
+            assert Path(old_copy).exists()
+
+            query = "SELECT COUNT(*) FROM Contact WHERE UserName = 'wxid_new'"
+            assert old_conn.execute(query).fetchone() == (0,)
+            assert new_conn.execute(query).fetchone() == (1,)
+        finally:
+            old_conn.close()
+            new_conn.close()
+
+        handler._cleanup_cache()
+        assert not Path(old_copy).exists()
+        assert not Path(new_copy).exists()
@@ -2,9 +2,9 @@
 
 import hashlib
 import os
+import sqlite3
 import struct
-import tempfile
-from pathlib import Path
+from contextlib import closing
 from unittest.mock import patch
 
 import pytest
@@ -18,14 +18,20 @@ from wechat_manager.core.decrypt import (
     PAGE_SIZE,
     RESERVED_SIZE,
     SQLITE_FILE_HEADER,
+    _DECRYPT_BATCH_PAGES,
     DecryptionError,
+    HmacCtx,
     InvalidKeyError,
+    _clear_key_cache,
     decrypt_database,
     decrypt_page,
+    decrypt_pages_bulk,
     derive_keys,
     is_encrypted_database,
     verify_hmac,
+    verify_hmac_ctx,
     verify_key,
+    verify_pages_hmac,
 )
 
 
@@ -33,6 +39,71 @@ from wechat_manager.core.decrypt import (
 TEST_KEY_HEX = "0" * 64  # 64 个零
 
 
+def build_reserved_db(path, n_rows: int) -> bytes:
+    """创建每页末尾留出 RESERVED_SIZE 字节的明文 SQLite 数据库，返回文件内容
+
+    sqlite3 模块无法直接设置保留字节：先写出只有第一页的空库，再修改文件头
+    (偏移 20) 与第一页 B 树的内容区起点，之后 SQLite 建表写入时会保留该区域。
+    """
+    with closing(sqlite3.connect(str(path))) as conn:
+        conn.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+    data = bytearray(path.read_bytes())
+    data[20] = RESERVED_SIZE
+    data[105:107] = struct.pack(">H", PAGE_SIZE - RESERVED_SIZE)
+    path.write_bytes(data)
+
+    with closing(sqlite3.connect(str(path))) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, content BLOB)")
+        conn.executemany(
+            "INSERT INTO t VALUES (?, ?)",
+            ((i, bytes([i % 256]) * 1000) for i in range(n_rows)),
+        )
+        conn.commit()
+    return path.read_bytes()
+
+
+def encrypt_sqlcipher3(key_hex: str, plain: bytes) -> bytes:
+    """按 SQLCipher 3 (微信 3.x) 格式加密明文数据库，每页 AES-CBC + HMAC-SHA1"""
+    salt = os.urandom(16)
+    decrypt_key, mac_key = derive_keys(key_hex, salt)
+    ctx = HmacCtx.new(mac_key)
+    cipher_end = PAGE_SIZE - RESERVED_SIZE
+
+    out = bytearray(salt)
+    for page_no in range(1, len(plain) // PAGE_SIZE + 1):
+        page = plain[(page_no - 1) * PAGE_SIZE : page_no * PAGE_SIZE]
+        # 第一页的前 16 字节 (SQLite 文件头) 由盐值代替，不参与加密
+        start = 16 if page_no == 1 else 0
+        iv = os.urandom(IV_SIZE)
+        body = AES.new(decrypt_key, AES.MODE_CBC, iv).encrypt(page[start:cipher_end])
+        body += iv
+        out += body
+        out += ctx.digest(body, struct.pack("<I", page_no))
+        out += b"\x00" * (RESERVED_SIZE - IV_SIZE - HMAC_SIZE)
+    return bytes(out)
+
+
+@pytest.fixture(scope="module")
+def sqlcipher_db(tmp_path_factory: pytest.TempPathFactory):
+    """模块内共享的 (密钥, 明文内容, 加密文件)，页数超过两个解密批次"""
+    base = tmp_path_factory.mktemp("sqlcipher_db")
+    key_hex = os.urandom(32).hex()
+    plain = build_reserved_db(base / "plain.db", 2400)
+    encrypted = base / "encrypted.db"
+    encrypted.write_bytes(encrypt_sqlcipher3(key_hex, plain))
+    return key_hex, plain, encrypted
+
+
+def assert_decrypted_matches(decrypted: bytes, plain: bytes) -> None:
+    """保留区保存的是 IV/HMAC，其余字节应与明文完全一致"""
+    assert len(decrypted) == len(plain)
+    for i in range(len(plain) // PAGE_SIZE):
+        page = slice(i * PAGE_SIZE, (i + 1) * PAGE_SIZE - RESERVED_SIZE)
+        assert decrypted[page] == plain[page], f"第 {i + 1} 页不一致"
+
+
 class TestDeriveKeys:
     """测试密钥派生"""
 
@@ -77,6 +148,24 @@ class TestDeriveKeys:
 
         assert mac_key == expected_mac_key
 
+    def test_derive_keys_cached(self):
+        """相同输入应命中缓存，清除后重新计算"""
+        salt = os.urandom(16)
+        _clear_key_cache()
+
+        with patch(
+            "wechat_manager.core.decrypt._pbkdf2_hmac", wraps=hashlib.pbkdf2_hmac
+        ) as pbkdf2:
+            key1 = derive_keys(TEST_KEY_HEX, salt)
+            key2 = derive_keys(TEST_KEY_HEX, bytearray(salt))
+            assert pbkdf2.call_count == 2
+
+            _clear_key_cache()
+            assert derive_keys(TEST_KEY_HEX, salt) == key1
+            assert pbkdf2.call_count == 4
+
+        assert key1 == key2
+
 
 class TestVerifyHmac:
     """测试 HMAC 验证"""
@@ -88,11 +177,8 @@ class TestVerifyHmac:
         # 数据部分 (PAGE_SIZE - 32)
         data = os.urandom(PAGE_SIZE - 32)
 
-        # 计算 HMAC
-        h = hmac.new(mac_key, digestmod="sha1")
-        h.update(data)
-        h.update(struct.pack("<I", page_number))
-        hmac_value = h.digest()
+        # 计算 HMAC (一次性 C 实现，无需创建 HMAC 对象)
+        hmac_value = hmac.digest(mac_key, data + struct.pack("<I", page_number), "sha1")
 
         # 填充
         padding = b"\x00" * 12
@@ -125,6 +211,26 @@ class TestVerifyHmac:
         corrupted = b"\xff" + page[1:]
         assert verify_hmac(mac_key, corrupted, 1) is False
 
+    def test_verify_hmac_ctx_reused_across_pages(self):
+        """预计算的 HMAC 状态可在多页间复用"""
+        salt = os.urandom(16)
+        _, mac_key = derive_keys(TEST_KEY_HEX, salt)
+        ctx = HmacCtx.new(mac_key)
+
+        pages = [self.create_page_with_hmac(mac_key, n) for n in (1, 2, 3)]
+        assert all(verify_hmac_ctx(ctx, page, n) for n, page in enumerate(pages, 1))
+        assert verify_hmac_ctx(ctx, pages[0], 2) is False
+
+    def test_verify_pages_hmac_bulk(self):
+        """批量验证应逐页返回结果"""
+        salt = os.urandom(16)
+        _, mac_key = derive_keys(TEST_KEY_HEX, salt)
+        ctx = HmacCtx.new(mac_key)
+
+        pages = [self.create_page_with_hmac(mac_key, n) for n in (2, 3, 4)]
+        pages[1] = bytes([pages[1][0] ^ 1]) + pages[1][1:]
+        assert verify_pages_hmac(ctx, b"".join(pages), 2) == [True, False, True]
+
 
 class TestDecryptPage:
     """测试页面解密"""
@@ -156,6 +262,29 @@ class TestDecryptPage:
 
         assert decrypted.startswith(b"Hello WeChat!")
 
+    def test_decrypt_pages_bulk_matches_per_page(self):
+        """批量解密结果应与逐页解密一致，并保留保留区"""
+        decrypt_key = os.urandom(KEY_SIZE)
+        pages = [self.create_encrypted_page(decrypt_key) for _ in range(3)]
+
+        # 末尾不完整的页面应被忽略
+        decrypted = decrypt_pages_bulk(decrypt_key, b"".join(pages) + b"\x00" * 100)
+
+        assert len(decrypted) == PAGE_SIZE * 3
+        for i, page in enumerate(pages):
+            chunk = decrypted[i * PAGE_SIZE : (i + 1) * PAGE_SIZE]
+            assert chunk[:-RESERVED_SIZE] == decrypt_page(decrypt_key, page, False)
+            assert chunk[-RESERVED_SIZE:] == page[-RESERVED_SIZE:]
+
+        # 复用 cipher 与暂存缓冲区 (缓冲区可以比数据长) 结果不变
+        cipher = AES.new(decrypt_key, AES.MODE_ECB)
+        scratch = bytearray(PAGE_SIZE * 4)
+        pages_data = b"".join(pages)
+        assert (
+            decrypt_pages_bulk(decrypt_key, pages_data, RESERVED_SIZE, cipher, scratch)
+            == decrypted
+        )
+
 
 class TestIsEncryptedDatabase:
     """测试加密检测"""
@@ -195,6 +324,7 @@ class TestDecryptDatabase:
         with pytest.raises(DecryptionError, match="文件太小"):
             decrypt_database(TEST_KEY_HEX, str(small_file))
 
+    @pytest.mark.slow
     def test_invalid_key(self, tmp_path):
         """无效密钥应该抛出异常"""
         # 创建一个看起来像加密数据库的文件
@@ -206,10 +336,126 @@ class TestDecryptDatabase:
         with pytest.raises(InvalidKeyError):
             decrypt_database(TEST_KEY_HEX, str(db_file))
 
+    @pytest.mark.parametrize("verify_pages", [False, True])
+    def test_round_trip_multiple_batches(
+        self, tmp_path, monkeypatch, sqlcipher_db, verify_pages
+    ):
+        """多批次 (含不满一批的末批) 并行解密后应还原明文数据库"""
+        # 限制线程数，保证按多轮窗口写出
+        monkeypatch.setattr("wechat_manager.core.decrypt._DECRYPT_MAX_WORKERS", 2)
+        key_hex, plain, encrypted = sqlcipher_db
+        assert len(plain) // PAGE_SIZE - 1 > 2 * _DECRYPT_BATCH_PAGES
+
+        out = decrypt_database(
+            key_hex,
+            str(encrypted),
+            str(tmp_path / "decrypted.db"),
+            verify_pages=verify_pages,
+        )
+        assert_decrypted_matches((tmp_path / "decrypted.db").read_bytes(), plain)
+
+        with closing(sqlite3.connect(out)) as conn:
+            assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+            rows = conn.execute("SELECT id, content FROM t ORDER BY id").fetchall()
+        assert len(rows) == 2400
+        assert rows[300] == (300, bytes([300 % 256]) * 1000)
+
+    def test_trailing_partial_page_ignored(self, tmp_path, sqlcipher_db):
+        """内存映射解密时，文件末尾不完整的页面 (如写入中途) 应被跳过"""
+        key_hex, plain, encrypted = sqlcipher_db
+        truncated = tmp_path / "truncated.db"
+        truncated.write_bytes(encrypted.read_bytes() + os.urandom(PAGE_SIZE // 2))
+
+        out = decrypt_database(key_hex, str(truncated), str(tmp_path / "out.db"))
+
+        with open(out, "rb") as f:
+            assert_decrypted_matches(f.read(), plain)
+
+    def test_thread_count_does_not_change_output(
+        self, tmp_path, monkeypatch, sqlcipher_db
+    ):
+        """线程池批次按顺序写出：不同线程数与小批次下结果逐字节相同"""
+        key_hex, plain, encrypted = sqlcipher_db
+        # 小批次让每个线程处理多批，末批不满一批
+        monkeypatch.setattr("wechat_manager.core.decrypt._DECRYPT_BATCH_PAGES", 7)
+
+        outputs = []
+        for workers in (1, 3, 8):
+            monkeypatch.setattr(
+                "wechat_manager.core.decrypt._DECRYPT_MAX_WORKERS", workers
+            )
+            out = decrypt_database(
+                key_hex, str(encrypted), str(tmp_path / f"out_{workers}.db")
+            )
+            with open(out, "rb") as f:
+                outputs.append(f.read())
+
+        assert_decrypted_matches(outputs[0], plain)
+        assert outputs[1] == outputs[0]
+        assert outputs[2] == outputs[0]
+
+    def test_scratch_buffer_reused_across_batches(
+        self, tmp_path, monkeypatch, sqlcipher_db
+    ):
+        """同一线程的各批次复用同一个暂存缓冲区，且前一批的残留不影响结果"""
+        import wechat_manager.core.decrypt as decrypt_module
+
+        key_hex, plain, encrypted = sqlcipher_db
+        monkeypatch.setattr(decrypt_module, "_DECRYPT_BATCH_PAGES", 7)
+        monkeypatch.setattr(decrypt_module, "_DECRYPT_MAX_WORKERS", 1)
+
+        scratches = []
+        original = decrypt_module.decrypt_pages_bulk
+
+        def recording_bulk(*args):
+            scratches.append(args[4])
+            return original(*args)
+
+        monkeypatch.setattr(decrypt_module, "decrypt_pages_bulk", recording_bulk)
+        out = decrypt_database(key_hex, str(encrypted), str(tmp_path / "out.db"))
+
+        assert len(scratches) > 2
+        assert all(scratch is scratches[0] for scratch in scratches)
+        with open(out, "rb") as f:
+            assert_decrypted_matches(f.read(), plain)
+
+    def test_sqlcipher_export_matches_python(self, tmp_path):
+        """SQLCipher 原生导出与纯 Python 解密结果应一致"""
+        sqlcipher = pytest.importorskip("sqlcipher3.dbapi2")
+
+        # 口令 "a" * 32 即 bytes.fromhex("61" * 32)，与微信密钥的派生方式一致
+        db_file = tmp_path / "cipher.db"
+        conn = sqlcipher.connect(str(db_file))
+        conn.execute("PRAGMA key = '%s'" % ("a" * 32))
+        conn.execute("PRAGMA cipher_compatibility = 3")
+        conn.execute(f"PRAGMA cipher_page_size = {PAGE_SIZE}")
+        conn.execute("CREATE TABLE t (id INTEGER, content TEXT)")
+        conn.executemany(
+            "INSERT INTO t VALUES (?, ?)", [(i, f"消息{i}") for i in range(2000)]
+        )
+        conn.commit()
+        conn.close()
+
+        rows = []
+        for use_sqlcipher in (True, False):
+            out = decrypt_database(
+                "61" * 32,
+                str(db_file),
+                str(tmp_path / f"plain_{use_sqlcipher}.db"),
+                version_hint=3,
+                use_sqlcipher=use_sqlcipher,
+            )
+            with closing(sqlite3.connect(out)) as plain:
+                rows.append(plain.execute("SELECT * FROM t ORDER BY id").fetchall())
+
+        assert len(rows[0]) == 2000
+        assert rows[0] == rows[1]
+
 
 class TestVerifyKey:
     """测试密钥验证"""
 
+    @pytest.mark.slow
     def test_invalid_key_returns_false(self, tmp_path):
         """无效密钥应该返回 False"""
         db_file = tmp_path / "test.db"
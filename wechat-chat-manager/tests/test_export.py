@@ -7,25 +7,15 @@ Tests TXT export functionality including format, file handling, and edge cases.
 import pytest
 from datetime import datetime
 from pathlib import Path
-from tempfile import TemporaryDirectory
 
-from wechat_manager.core.storage import EncryptedStorage
 from wechat_manager.core.export import ExportService
 from wechat_manager.models.chat import Contact, Message
 
 
 @pytest.fixture
-def temp_dir():
-    """Create temporary directory for testing"""
-    with TemporaryDirectory() as tmp_dir:
-        yield tmp_dir
-
-
-@pytest.fixture
-def storage(temp_dir):
+def storage(temp_dir, make_storage):
     """Create encrypted storage instance for testing"""
-    storage_path = Path(temp_dir) / "storage"
-    return EncryptedStorage(str(storage_path), "test_password")
+    return make_storage(Path(temp_dir) / "storage")
 
 
 @pytest.fixture
@@ -246,3 +236,72 @@ def test_message_sender_display(storage, export_service):
     # Second message should show "我" as sender
     assert "我:" in message_lines[1]
     assert "我的消息" in message_lines[1]
+
+
+def test_stream_txt_matches_file_export(storage, export_service, monkeypatch):
+    """Test that the streamed download carries the same text as the file export"""
+    contact = Contact(id="stream_test", username="user000", nickname="赵六")
+    storage.store_contact(contact)
+
+    now = int(datetime.now().timestamp())
+    storage.store_messages(
+        "stream_test",
+        [
+            Message(
+                contact_id="stream_test",
+                content=f"消息 {i}",
+                create_time=now + i,
+                is_sender=i % 2 == 0,
+            )
+            for i in range(20)
+        ],
+    )
+
+    # Force several chunks
+    monkeypatch.setattr(ExportService, "STREAM_CHUNK_SIZE", 64)
+    filename, chunks = export_service.stream_txt("stream_test")
+    chunks = list(chunks)
+    assert filename.startswith("赵六_") and filename.endswith(".txt")
+    assert len(chunks) > 1
+
+    streamed = b"".join(chunks).decode("utf-8").split("\n")
+    exported = (
+        Path(export_service.export_to_txt("stream_test"))
+        .read_text(encoding="utf-8")
+        .split("\n")
+    )
+    # Skip the export-time header line, which may tick between the two calls
+    assert streamed[0] == exported[0]
+    assert streamed[2:] == exported[2:]
+
+
+def test_stream_txt_nonexistent_contact(export_service):
+    """Test that a missing contact fails before any bytes are streamed"""
+    with pytest.raises(ValueError, match="Contact .* not found"):
+        export_service.stream_txt("nonexistent_contact")
+
+
+def test_export_multiple_unknown_contact_writes_nothing(storage, export_service):
+    """Test that an unknown id fails the batch before any file is written"""
+    storage.store_contact(Contact(id="batch_ok", username="ok", nickname="好"))
+
+    with pytest.raises(ValueError, match="Contact batch_missing not found"):
+        export_service.export_multiple(["batch_ok", "batch_missing"])
+
+    assert list(export_service.export_dir.iterdir()) == []
+
+
+def test_export_multiple_distinct_files(storage, export_service):
+    """Test that a batch never writes two contacts to the same file"""
+    for i in range(4):
+        storage.store_contact(Contact(id=f"same_{i}", username=f"u{i}", nickname="同名"))
+
+    ids = ["same_0", "same_1", "same_2", "same_3", "same_0"]
+    filepaths = export_service.export_multiple(ids)
+
+    assert len(filepaths) == 5
+    assert filepaths[4] == filepaths[0]
+    assert len(set(filepaths)) == 4
+    assert sorted(p.name for p in export_service.export_dir.iterdir()) == sorted(
+        Path(p).name for p in set(filepaths)
+    )
@@ -11,20 +11,21 @@ from wechat_manager.core.key_extractor import (
     set_manual_key,
     InvalidKeyError,
 )
+from tests.conftest import TEST_DB_KEY
 
 
 class TestKeyValidation:
     """Tests for key format validation."""
 
-    def test_validate_key_with_mock_db(self, test_db_key, temp_dir):
+    def test_validate_key_with_mock_db(self, temp_dir):
         """Validate a key against a mock database (format check only)."""
         mock_db = temp_dir / "test.db"
         mock_db.touch()
-        assert validate_key(test_db_key, str(mock_db)) is True
+        assert validate_key(TEST_DB_KEY, str(mock_db)) is True
 
-    def test_validate_key_correct_format(self, test_db_key):
+    def test_validate_key_correct_format(self):
         """Test key validation with correct 64 hex char format."""
-        assert validate_key(test_db_key, "any_path.db") is True
+        assert validate_key(TEST_DB_KEY, "any_path.db") is True
 
     def test_invalid_key_rejected_too_short(self):
         """Reject key that is too short."""
@@ -58,14 +59,14 @@ class TestKeyValidation:
 class TestManualKeyInput:
     """Tests for manual key input."""
 
-    def test_manual_key_input_valid(self, test_db_key):
+    def test_manual_key_input_valid(self):
         """Accept valid manual key input (64 hex chars)."""
         with patch(
             "wechat_manager.core.key_extractor.save_key_to_keyring"
         ) as mock_save:
-            result = set_manual_key(test_db_key)
+            result = set_manual_key(TEST_DB_KEY)
             assert result is True
-            mock_save.assert_called_once_with(test_db_key)
+            mock_save.assert_called_once_with(TEST_DB_KEY)
 
     def test_manual_key_input_invalid_format(self):
         """Reject invalid manual key input."""
@@ -97,19 +98,19 @@ class TestKeyringStorage:
     """Tests for keyring storage and retrieval."""
 
     @patch("wechat_manager.core.key_extractor.keyring.set_password")
-    def test_keyring_storage_save(self, mock_set_password, test_db_key):
+    def test_keyring_storage_save(self, mock_set_password):
         """Store key to keyring."""
-        save_key_to_keyring(test_db_key)
+        save_key_to_keyring(TEST_DB_KEY)
         mock_set_password.assert_called_once_with(
-            "wechat_chat_manager", "db_key", test_db_key
+            "wechat_chat_manager", "db_key", TEST_DB_KEY
         )
 
     @patch("wechat_manager.core.key_extractor.keyring.get_password")
-    def test_keyring_storage_retrieve(self, mock_get_password, test_db_key):
+    def test_keyring_storage_retrieve(self, mock_get_password):
         """Retrieve key from keyring."""
-        mock_get_password.return_value = test_db_key
+        mock_get_password.return_value = TEST_DB_KEY
         result = get_key_from_keyring()
-        assert result == test_db_key
+        assert result == TEST_DB_KEY
         mock_get_password.assert_called_once_with("wechat_chat_manager", "db_key")
 
     @patch("wechat_manager.core.key_extractor.keyring.get_password")
@@ -118,3 +119,15 @@ class TestKeyringStorage:
         mock_get_password.return_value = None
         result = get_key_from_keyring()
         assert result is None
+
+    @patch("wechat_manager.core.key_extractor.keyring.get_password")
+    def test_keyring_lookup_cached(self, mock_get_password):
+        """Repeated lookups within the TTL hit the keyring once; saving refreshes."""
+        mock_get_password.return_value = None
+        assert get_key_from_keyring() is None
+        assert get_key_from_keyring() is None
+        mock_get_password.assert_called_once()
+
+        save_key_to_keyring(TEST_DB_KEY)
+        assert get_key_from_keyring() == TEST_DB_KEY
+        mock_get_password.assert_called_once()
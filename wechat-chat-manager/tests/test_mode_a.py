@@ -5,107 +5,85 @@ Tests extraction of WeChat chat data to encrypted storage while
 ensuring the original databases remain unmodified.
 """
 
+import hashlib
+import shutil
 import sqlite3
+from operator import attrgetter
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from pathlib import Path
-import time
-import hashlib
+from unittest.mock import patch
 
 from wechat_manager.core.mode_a import ModeA
 from wechat_manager.core.db_handler import WeChatDBHandler
-from wechat_manager.core.storage import EncryptedStorage
-from wechat_manager.models.chat import Contact, Message
-
-
-def create_mock_micromsg(path: Path) -> None:
-    """创建模拟的 MicroMsg.db 数据库"""
-    conn = sqlite3.connect(str(path))
-    conn.execute("""CREATE TABLE Contact (
-        UserName TEXT PRIMARY KEY,
-        NickName TEXT,
-        Alias TEXT,
-        Remark TEXT,
-        Type INTEGER
-    )""")
-    conn.execute("""CREATE TABLE ChatRoom (
-        ChatRoomName TEXT PRIMARY KEY,
-        UserNameList TEXT
-    )""")
-    # 插入测试数据
-    conn.execute(
-        "INSERT INTO Contact VALUES ('wxid_test1', '张三', 'zhangsan', '同事张三', 1)"
-    )
-    conn.execute("INSERT INTO Contact VALUES ('wxid_test2', '李四', NULL, NULL, 1)")
-    conn.execute(
-        "INSERT INTO Contact VALUES ('wxid_test3', '王五', 'wangwu', '同学王五', 1)"
-    )
-    conn.commit()
-    conn.close()
-
-
-def create_mock_msg(path: Path, talker_mapping: dict | None = None) -> None:
-    """创建模拟的 MSGn.db 数据库"""
-    conn = sqlite3.connect(str(path))
-    conn.execute("""CREATE TABLE MSG (
-        localId INTEGER PRIMARY KEY,
-        TalkerId INTEGER,
-        Type INTEGER,
-        SubType INTEGER,
-        CreateTime INTEGER,
-        IsSender INTEGER,
-        StrContent TEXT
-    )""")
-    conn.execute("""CREATE TABLE Name2Id (
-        rowId INTEGER PRIMARY KEY,
-        UsrName TEXT
-    )""")
-
-    # 默认的 talker 映射
-    if talker_mapping is None:
-        talker_mapping = {1: "wxid_test1", 2: "wxid_test2"}
-
-    # 插入 Name2Id 映射数据
-    for talker_id, username in talker_mapping.items():
-        conn.execute("INSERT INTO Name2Id VALUES (?, ?)", (talker_id, username))
-
-    # 插入测试消息
-    conn.execute("INSERT INTO MSG VALUES (1, 1, 1, 0, 1704067200, 0, '你好')")
-    conn.execute("INSERT INTO MSG VALUES (2, 1, 1, 0, 1704067260, 1, '你好啊')")
-    conn.execute("INSERT INTO MSG VALUES (3, 1, 1, 0, 1704067320, 0, '今天天气不错')")
-    conn.execute("INSERT INTO MSG VALUES (4, 2, 1, 0, 1704067400, 1, '好的，收到')")
-    conn.execute("INSERT INTO MSG VALUES (5, 2, 1, 0, 1704067460, 0, '谢谢')")
-    conn.commit()
-    conn.close()
-
-
-def get_file_hash(path: Path) -> str:
-    """Get MD5 hash of a file for integrity comparison"""
-    with open(path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+from wechat_manager.models.chat import Message
+from tests.conftest import TEST_DB_KEY, create_mock_micromsg, create_mock_msg
 
 
-@pytest.fixture
-def mode_a_setup(temp_dir: Path, test_db_key: str, test_password: str):
-    """Setup Mode A with mock databases"""
+def _fingerprint(path: Path) -> tuple:
+    """Modification check: mtime plus a BLAKE2b hash of the (tiny) file"""
+    return (path.stat().st_mtime_ns, hashlib.blake2b(path.read_bytes()).hexdigest())
+
+
+def _copy_source_dbs(template_dir: Path, msg_dir: Path) -> None:
+    """Copy the mock databases from the session template into msg_dir
+
+    A copy, not a hardlink: a stray write to a source DB must not reach the
+    template, and each test starts from pristine sources.
+    """
+    for name in ("MicroMsg.db", "MSG0.db"):
+        shutil.copy2(template_dir / name, msg_dir / name)
+
+
+@pytest.fixture(scope="session")
+def _mock_db_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Build the mock databases once per session; tests copy them"""
+    template_dir = tmp_path_factory.mktemp("mode_a_template")
+    create_mock_micromsg(template_dir / "MicroMsg.db")
+    create_mock_msg(template_dir / "MSG0.db")
+    return template_dir
+
+
+@pytest.fixture(scope="module")
+def _mode_a_module(
+    tmp_path_factory: pytest.TempPathFactory, _mock_db_template: Path, make_storage
+):
+    """Build Mode A once per module; mode_a_setup empties its storage per test"""
+    temp_dir = tmp_path_factory.mktemp("mode_a")
     # Create mock WeChat structure
     wechat_dir = temp_dir / "WeChat Files" / "wxid_test"
     msg_dir = wechat_dir / "Msg"
     msg_dir.mkdir(parents=True)
 
-    # Create mock databases with test data
-    create_mock_micromsg(msg_dir / "MicroMsg.db")
-    create_mock_msg(msg_dir / "MSG0.db")
+    # Copy mock databases with test data from the session template
+    _copy_source_dbs(_mock_db_template, msg_dir)
 
     # Create storage
     storage_dir = temp_dir / "data"
     storage_dir.mkdir()
 
     # Initialize components
-    db_handler = WeChatDBHandler(str(wechat_dir), test_db_key)
-    storage = EncryptedStorage(str(storage_dir), test_password)
+    db_handler = WeChatDBHandler(str(wechat_dir), TEST_DB_KEY)
+    storage = make_storage(storage_dir)
     mode_a = ModeA(db_handler, storage)
 
-    return mode_a, db_handler, storage, msg_dir
+    # The fixture's own connection, used only to reset storage between tests
+    reset_conn = sqlite3.connect(str(storage.db_path))
+    try:
+        yield mode_a, db_handler, storage, msg_dir, reset_conn
+    finally:
+        reset_conn.close()
+
+
+@pytest.fixture
+def mode_a_setup(_mode_a_module, _mock_db_template):
+    """Setup Mode A with fresh mock databases and empty storage"""
+    _copy_source_dbs(_mock_db_template, _mode_a_module[3])
+    reset_conn = _mode_a_module[4]
+    with reset_conn:
+        reset_conn.execute("DELETE FROM messages")
+        reset_conn.execute("DELETE FROM contacts")
+    return _mode_a_module[:4]
 
 
 class TestExtractMessages:
@@ -126,7 +104,7 @@ class TestExtractMessages:
         # Verify messages stored
         messages = storage.get_messages("wxid_test1", limit=100)
         assert len(messages) == 3
-        contents = {m.content for m in messages}
+        contents = set(map(attrgetter("content"), messages))
         assert "你好" in contents
         assert "你好啊" in contents
         assert "今天天气不错" in contents
@@ -170,7 +148,7 @@ class TestExtractMultipleContacts:
 
         # Verify all contacts stored
         contacts = storage.list_contacts()
-        contact_ids = {c.id for c in contacts}
+        contact_ids = set(map(attrgetter("id"), contacts))
         assert "wxid_test1" in contact_ids
         assert "wxid_test2" in contact_ids
 
@@ -187,6 +165,18 @@ class TestExtractMultipleContacts:
         assert results[1]["success"] is False
         assert results[2]["success"] is True
 
+    def test_extract_multiple_reads_contact_list_once(self, mode_a_setup):
+        """The WeChat contact list is read once for the whole batch"""
+        mode_a, db_handler, storage, msg_dir = mode_a_setup
+
+        with patch.object(
+            db_handler, "get_contacts", wraps=db_handler.get_contacts
+        ) as get_contacts:
+            results = mode_a.extract_multiple(["wxid_test1", "wxid_test2"])
+
+        assert get_contacts.call_count == 1
+        assert [r["message_count"] for r in results] == [3, 2]
+
 
 class TestViewExtracted:
     """Test viewing previously extracted messages"""
@@ -205,7 +195,7 @@ class TestViewExtracted:
         assert all(isinstance(m, Message) for m in messages)
 
         # Verify message contents
-        contents = [m.content for m in messages]
+        contents = list(map(attrgetter("content"), messages))
         assert "你好" in contents
 
     def test_view_extracted_with_limit(self, mode_a_setup):
@@ -234,20 +224,20 @@ class TestOriginalDBUnchanged:
         """Verify source DB is not modified during extraction"""
         mode_a, db_handler, storage, msg_dir = mode_a_setup
 
-        # Get file hashes before extraction
+        # Get file fingerprints before extraction
         micromsg_path = msg_dir / "MicroMsg.db"
         msg0_path = msg_dir / "MSG0.db"
 
-        hash_micromsg_before = get_file_hash(micromsg_path)
-        hash_msg0_before = get_file_hash(msg0_path)
+        hash_micromsg_before = _fingerprint(micromsg_path)
+        hash_msg0_before = _fingerprint(msg0_path)
 
         # Perform extraction
         mode_a.extract_contact("wxid_test1")
         mode_a.extract_contact("wxid_test2")
 
-        # Get file hashes after extraction
-        hash_micromsg_after = get_file_hash(micromsg_path)
-        hash_msg0_after = get_file_hash(msg0_path)
+        # Get file fingerprints after extraction
+        hash_micromsg_after = _fingerprint(micromsg_path)
+        hash_msg0_after = _fingerprint(msg0_path)
 
         # Verify files unchanged
         assert hash_micromsg_before == hash_micromsg_after
@@ -258,15 +248,21 @@ class TestOriginalDBUnchanged:
         mode_a, db_handler, storage, msg_dir = mode_a_setup
 
         micromsg_path = msg_dir / "MicroMsg.db"
-        hash_before = get_file_hash(micromsg_path)
+        hash_before = _fingerprint(micromsg_path)
 
-        # Multiple extractions
-        for _ in range(3):
-            mode_a.extract_contact("wxid_test1")
+        # Multiple extractions, run concurrently: the source DB is only read
+        # and storage writes are INSERT OR IGNORE on (contact_id, original_id)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(mode_a.extract_contact, ["wxid_test1"] * 3))
 
-        hash_after = get_file_hash(micromsg_path)
+        hash_after = _fingerprint(micromsg_path)
         assert hash_before == hash_after
 
+        assert all(r["success"] for r in results)
+        # Same rows as a single extraction: no duplicates from the overlap
+        single_count = len(db_handler.get_messages("wxid_test1"))
+        assert len(storage.get_messages("wxid_test1")) == single_count == 3
+
 
 class TestListExtractedContacts:
     """Test listing all extracted contacts"""
@@ -287,7 +283,7 @@ class TestListExtractedContacts:
         contacts = mode_a.get_extracted_contacts()
         assert len(contacts) == 2
 
-        contact_ids = {c.id for c in contacts}
+        contact_ids = set(map(attrgetter("id"), contacts))
         assert "wxid_test1" in contact_ids
         assert "wxid_test2" in contact_ids
 
@@ -385,4 +381,4 @@ class TestContactInfoPreserved:
         mode_a.extract_contact("wxid_test1")
 
         messages = storage.get_messages("wxid_test1", limit=100)
-        assert all(m.original_id is not None for m in messages)
+        assert None not in map(attrgetter("original_id"), messages)
@@ -3,27 +3,15 @@ Tests for SearchService module
 """
 
 import pytest
-import tempfile
-import shutil
-from pathlib import Path
 
 from wechat_manager.models.chat import Contact, Message
-from wechat_manager.core.storage import EncryptedStorage
 from wechat_manager.core.search import SearchService
 
 
-@pytest.fixture
-def temp_storage():
-    """Create temporary storage for testing"""
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    shutil.rmtree(temp_dir, ignore_errors=True)
-
-
-@pytest.fixture
-def storage(temp_storage):
-    """Initialize storage with test data"""
-    storage = EncryptedStorage(temp_storage, "test_password")
+@pytest.fixture(scope="module")
+def storage(tmp_path_factory: pytest.TempPathFactory, make_storage):
+    """Initialize storage with test data, once per module (tests only read it)"""
+    storage = make_storage(tmp_path_factory.mktemp("search"))
 
     # Create test contacts
     contact1 = Contact(id="wxid_001", username="testuser1", nickname="Test User 1")
@@ -93,9 +81,9 @@ def storage(temp_storage):
     return storage
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def search_service(storage):
-    """Initialize search service"""
+    """Initialize search service, shared across the module"""
     return SearchService(storage)
 
 
@@ -2,37 +2,76 @@
 Tests for wechat_manager.core.storage - Encrypted Local Storage System
 """
 
+import sqlite3
 import pytest
 from pathlib import Path
 import time
 
-from wechat_manager.core.storage import EncryptedStorage
+from wechat_manager.core.storage import EncryptedStorage, _pbkdf2_sha256
 from wechat_manager.models.chat import Contact, Message
+from tests.conftest import TEST_PASSWORD
 
 
 class TestEncryptedStorageCreation:
-    def test_create_encrypted_storage(self, storage_dir: Path, test_password: str):
+    def test_create_encrypted_storage(self, storage_dir: Path):
         """Test creating a new encrypted storage database"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
 
         assert storage.db_path.exists()
         assert (storage_dir / ".salt").exists()
 
-    def test_salt_persists_across_sessions(self, storage_dir: Path, test_password: str):
+    def test_salt_persists_across_sessions(self, storage_dir: Path):
         """Test that salt file is reused on subsequent opens"""
-        storage1 = EncryptedStorage(str(storage_dir), test_password)
+        storage1 = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
         salt1 = (storage_dir / ".salt").read_bytes()
 
-        storage2 = EncryptedStorage(str(storage_dir), test_password)
+        storage2 = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
         salt2 = (storage_dir / ".salt").read_bytes()
 
         assert salt1 == salt2
 
+    def test_pre_derived_key_skips_kdf(self, storage_dir: Path):
+        """Test that a pre-derived key is used as-is"""
+        storage1 = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
+
+        storage2 = EncryptedStorage(
+            str(storage_dir), TEST_PASSWORD, key=storage1._key
+        )
+
+        assert storage2._key == storage1._key
+        assert storage2.db_path.exists()
+
+    def test_pre_derived_key_requires_salt(self, storage_dir: Path, make_storage):
+        """Test that a pre-derived key cannot create a salt-less storage"""
+        key = make_storage(storage_dir / "source")._key
+
+        with pytest.raises(ValueError, match=".salt"):
+            EncryptedStorage(str(storage_dir / "fresh"), TEST_PASSWORD, key=key)
+
+    def test_make_storage_reopens_with_password(self, storage_dir: Path, make_storage):
+        """Test that storage opened with a cached key also opens by password"""
+        storage1 = make_storage(storage_dir)
+        storage2 = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
+
+        assert storage2._key == storage1._key
+
+    def test_key_derivation_memoized(self):
+        """Test that PBKDF2 runs once per (password, salt, parameters)"""
+        salt = b"\x01" * 16
+        key1 = _pbkdf2_sha256(TEST_PASSWORD, salt, 1000, 32)
+        hits = _pbkdf2_sha256.cache_info().hits
+
+        key2 = _pbkdf2_sha256(TEST_PASSWORD, salt, 1000, 32)
+
+        assert key2 == key1
+        assert _pbkdf2_sha256.cache_info().hits == hits + 1
+        assert _pbkdf2_sha256(TEST_PASSWORD, salt, 1001, 32) != key1
+
 
 class TestMessageStorage:
-    def test_store_messages(self, storage_dir: Path, test_password: str):
+    def test_store_messages(self, storage_dir: Path, make_storage):
         """Test storing messages to encrypted storage"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contact = Contact(
             id="wxid_test123",
@@ -61,9 +100,9 @@ class TestMessageStorage:
         count = storage.store_messages("wxid_test123", messages)
         assert count == 2
 
-    def test_read_stored_messages(self, storage_dir: Path, test_password: str):
+    def test_read_stored_messages(self, storage_dir: Path, make_storage):
         """Test reading messages from encrypted storage"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contact = Contact(
             id="wxid_reader",
@@ -103,11 +142,116 @@ class TestMessageStorage:
         assert retrieved[0].content == "First message"
         assert retrieved[2].content == "Third message"
 
+    def test_store_messages_from_generator(self, storage_dir: Path, make_storage):
+        """Test storing messages from a one-shot iterable"""
+        storage = make_storage(storage_dir)
+        now = int(time.time())
+
+        count = storage.store_messages(
+            "wxid_gen",
+            (
+                Message(
+                    contact_id="wxid_gen",
+                    original_id=i,
+                    content=f"Message {i}",
+                    create_time=now + i,
+                    is_sender=False,
+                )
+                for i in range(3)
+            ),
+        )
+
+        assert count == 3
+        assert len(storage.get_messages("wxid_gen")) == 3
+
+    def test_store_messages_in_chunks(
+        self, storage_dir: Path, make_storage, monkeypatch
+    ):
+        """Test that chunked storing matches storing in one batch"""
+        monkeypatch.setattr(EncryptedStorage, "_STORE_CHUNK", 2)
+        storage = make_storage(storage_dir)
+        now = int(time.time())
+
+        def message(original_id: int, content: str) -> Message:
+            return Message(
+                contact_id="wxid_chunk",
+                original_id=original_id,
+                content=content,
+                create_time=now + original_id,
+                is_sender=False,
+            )
+
+        # 4001 repeats in a later chunk: placeholder replaced, duplicate ignored
+        count = storage.store_messages(
+            "wxid_chunk",
+            iter(
+                [
+                    message(4001, "[文本消息]"),
+                    message(4002, "B"),
+                    message(4003, "C"),
+                    message(4001, "A"),
+                    message(4002, "ignored"),
+                ]
+            ),
+        )
+
+        assert count == 4
+        retrieved = storage.get_messages("wxid_chunk")
+        assert [m.content for m in retrieved] == ["A", "B", "C"]
+
+    def test_store_messages_replaces_placeholder_content(
+        self, storage_dir: Path, make_storage
+    ):
+        """Test placeholders are replaced, within a batch and across batches"""
+        storage = make_storage(storage_dir)
+
+        now = int(time.time())
+
+        def message(original_id: int, content: str) -> Message:
+            return Message(
+                contact_id="wxid_dedupe",
+                original_id=original_id,
+                content=content,
+                create_time=now,
+                is_sender=False,
+            )
+
+        count = storage.store_messages(
+            "wxid_dedupe",
+            [
+                message(3001, "[文本消息]"),
+                message(3001, "Recovered"),
+                message(3002, "[不支持的消息]"),
+            ],
+        )
+        assert count == 3
+
+        count = storage.store_messages(
+            "wxid_dedupe", [message(3001, "Ignored"), message(3002, "Later")]
+        )
+        assert count == 1
+
+        retrieved = storage.get_messages("wxid_dedupe")
+        assert sorted(m.content for m in retrieved) == ["Later", "Recovered"]
+
+    def test_read_only_connection_rejects_writes(
+        self, storage_dir: Path, make_storage
+    ):
+        """Test that read-only connections can query but not write"""
+        storage = make_storage(storage_dir)
+        conn = storage._get_connection(read_only=True)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM messages").fetchone() == (0,)
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM messages")
+        finally:
+            conn.close()
+
 
 class TestPasswordValidation:
-    def test_wrong_password_rejected(self, storage_dir: Path, test_password: str):
+    def test_wrong_password_rejected(self, storage_dir: Path):
         """Test that wrong password produces different derived key"""
-        storage1 = EncryptedStorage(str(storage_dir), test_password)
+        storage1 = EncryptedStorage(str(storage_dir), TEST_PASSWORD)
 
         contact = Contact(
             id="wxid_secret",
@@ -122,9 +266,9 @@ class TestPasswordValidation:
 
 
 class TestContactStorage:
-    def test_store_contact(self, storage_dir: Path, test_password: str):
+    def test_store_contact(self, storage_dir: Path, make_storage):
         """Test storing contact info"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contact = Contact(
             id="wxid_contact1",
@@ -143,9 +287,9 @@ class TestContactStorage:
         assert retrieved.nickname == "Contact One"
         assert retrieved.remark == "My Friend"
 
-    def test_list_hidden_contacts(self, storage_dir: Path, test_password: str):
+    def test_list_hidden_contacts(self, storage_dir: Path, make_storage):
         """Test listing all hidden contacts"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contacts = [
             Contact(id="wxid_a", username="user_a", nickname="User A"),
@@ -162,11 +306,22 @@ class TestContactStorage:
         ids = {c.id for c in all_contacts}
         assert ids == {"wxid_a", "wxid_b", "wxid_c"}
 
+    def test_get_contacts_bulk(self, storage_dir: Path, make_storage):
+        """Test looking up several contacts in one call"""
+        storage = make_storage(storage_dir)
+        for name in ("a", "b", "c"):
+            storage.store_contact(Contact(id=f"wxid_{name}", username=f"user_{name}"))
+
+        found = storage.get_contacts(["wxid_c", "wxid_missing", "wxid_a", "wxid_a"])
+        assert set(found) == {"wxid_a", "wxid_c"}
+        assert found["wxid_c"].username == "user_c"
+        assert storage.get_contacts([]) == {}
+
 
 class TestDeletion:
-    def test_delete_contact_messages(self, storage_dir: Path, test_password: str):
+    def test_delete_contact_messages(self, storage_dir: Path, make_storage):
         """Test deleting a contact and all their messages"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contact = Contact(
             id="wxid_delete",
@@ -201,9 +356,9 @@ class TestDeletion:
 
 
 class TestSearch:
-    def test_search_messages(self, storage_dir: Path, test_password: str):
+    def test_search_messages(self, storage_dir: Path, make_storage):
         """Test searching messages by content"""
-        storage = EncryptedStorage(str(storage_dir), test_password)
+        storage = make_storage(storage_dir)
 
         contact = Contact(
             id="wxid_search",
@@ -241,3 +396,51 @@ class TestSearch:
         results = storage.search_messages("tomorrow")
         assert len(results) == 1
         assert "tomorrow" in results[0].content
+
+    def test_search_index_follows_updates_and_deletes(
+        self, storage_dir: Path, make_storage
+    ):
+        """Test the content index tracks replaced and deleted messages"""
+        storage = make_storage(storage_dir)
+        now = int(time.time())
+
+        storage.store_messages(
+            "wxid_fts",
+            [
+                Message(
+                    contact_id="wxid_fts",
+                    original_id=1,
+                    content="[文本消息]",
+                    create_time=now,
+                    is_sender=False,
+                ),
+                Message(
+                    contact_id="wxid_fts",
+                    original_id=2,
+                    content="今天天气很好",
+                    create_time=now + 1,
+                    is_sender=True,
+                ),
+            ],
+        )
+        storage.store_messages(
+            "wxid_fts",
+            [
+                Message(
+                    contact_id="wxid_fts",
+                    original_id=1,
+                    content="Coffee tomorrow?",
+                    create_time=now,
+                    is_sender=False,
+                )
+            ],
+        )
+
+        assert storage.search_messages("文本消息") == []
+        assert [m.content for m in storage.search_messages("COFFEE")] == [
+            "Coffee tomorrow?"
+        ]
+        assert len(storage.search_messages("天气很")) == 1
+
+        storage.delete_contact("wxid_fts")
+        assert storage.search_messages("coffee") == []
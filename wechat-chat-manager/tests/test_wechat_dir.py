@@ -11,7 +11,9 @@ Tests cover:
 
 import pytest
 import os
+import shutil
 from pathlib import Path
+from wechat_manager.core import wechat_dir as wechat_dir_module
 from wechat_manager.core.wechat_dir import (
     auto_detect_wechat_dir,
     set_wechat_dir,
@@ -20,12 +22,21 @@ from wechat_manager.core.wechat_dir import (
     get_msg_dir,
     get_current_wechat_dir,
 )
+from tests.conftest import WECHAT_TREE_WXIDS
+
+
+@pytest.fixture(autouse=True)
+def _clear_auto_detect_cache():
+    """auto_detect_wechat_dir is memoized; never let a result leak between tests"""
+    auto_detect_wechat_dir.cache_clear()
+    yield
+    auto_detect_wechat_dir.cache_clear()
 
 
 class TestAutoDetect:
     """Tests for auto_detect_wechat_dir function"""
 
-    def test_auto_detect_with_valid_dir(self, temp_dir):
+    def test_auto_detect_with_valid_dir(self, temp_dir, monkeypatch):
         """Test auto-detection when valid WeChat directory exists"""
         # Create a valid WeChat structure in temp_dir
         wechat_files = temp_dir / "WeChat Files"
@@ -34,33 +45,37 @@ class TestAutoDetect:
         msg_dir.mkdir(parents=True)
         (msg_dir / "MicroMsg.db").write_bytes(b"x")
 
-        # Temporarily patch DEFAULT_PATHS to use our temp directory
-        from wechat_manager.core import wechat_dir as wechat_dir_module
+        # Point DEFAULT_PATHS at our temp directory
+        monkeypatch.setattr(wechat_dir_module, "DEFAULT_PATHS", [str(wechat_files)])
+        result = auto_detect_wechat_dir()
+        assert result is not None
+        assert Path(result).exists()
+
+    def test_auto_detect_forgets_removed_dir(self, temp_dir, monkeypatch):
+        """Test that a remembered directory is re-detected once it is gone"""
+        paths = []
+        for name in ("first", "second"):
+            msg_dir = temp_dir / name / "WeChat Files" / "wxid_abc123" / "Msg"
+            msg_dir.mkdir(parents=True)
+            (msg_dir / "MicroMsg.db").write_bytes(b"x")
+            paths.append(msg_dir.parent.parent)
+        monkeypatch.setattr(wechat_dir_module, "DEFAULT_PATHS", [str(p) for p in paths])
+        assert auto_detect_wechat_dir() == str(paths[0])
+
+        shutil.rmtree(paths[0])
 
-        original_paths = wechat_dir_module.DEFAULT_PATHS
-        try:
-            wechat_dir_module.DEFAULT_PATHS = [str(wechat_files)]
-            result = wechat_dir_module.auto_detect_wechat_dir()
-            assert result is not None
-            assert Path(result).exists()
-        finally:
-            wechat_dir_module.DEFAULT_PATHS = original_paths
+        assert auto_detect_wechat_dir() == str(paths[1])
 
-    def test_auto_detect_no_valid_dir(self):
+    def test_auto_detect_no_valid_dir(self, monkeypatch):
         """Test auto-detection returns None when no valid directory exists"""
-        from wechat_manager.core import wechat_dir as wechat_dir_module
-
-        original_paths = wechat_dir_module.DEFAULT_PATHS
-        try:
-            # Set paths to non-existent directories
-            wechat_dir_module.DEFAULT_PATHS = [
-                "/nonexistent/path1",
-                "/nonexistent/path2",
-            ]
-            result = wechat_dir_module.auto_detect_wechat_dir()
-            assert result is None
-        finally:
-            wechat_dir_module.DEFAULT_PATHS = original_paths
+        # Set paths to non-existent directories
+        monkeypatch.setattr(
+            wechat_dir_module,
+            "DEFAULT_PATHS",
+            ["/nonexistent/path1", "/nonexistent/path2"],
+        )
+        result = auto_detect_wechat_dir()
+        assert result is None
 
 
 class TestManualPath:
@@ -127,101 +142,46 @@ class TestInvalidPath:
 class TestValidateStructure:
     """Tests for validate_wechat_dir function with valid structures"""
 
-    def test_validate_structure_basic(self, temp_dir):
+    def test_validate_structure_basic(self, mock_wechat_dir):
         """Test validation passes for correct directory structure"""
-        wechat_files = temp_dir / "WeChat Files"
-        wxid_folder = wechat_files / "wxid_ghi789"
-        msg_dir = wxid_folder / "Msg"
-        msg_dir.mkdir(parents=True)
-        (msg_dir / "MicroMsg.db").write_bytes(b"x")
-        (msg_dir / "MSG0.db").touch()
-
-        result = validate_wechat_dir(str(wechat_files))
+        result = validate_wechat_dir(str(mock_wechat_dir.parent))
         assert result is True
 
-    def test_validate_structure_multiple_wxid(self, temp_dir):
+    def test_validate_structure_multiple_wxid(self, wechat_tree):
         """Test validation with multiple wxid folders"""
-        wechat_files = temp_dir / "WeChat Files"
-
-        # Create first wxid folder
-        wxid_folder1 = wechat_files / "wxid_first"
-        msg_dir1 = wxid_folder1 / "Msg"
-        msg_dir1.mkdir(parents=True)
-        (msg_dir1 / "MicroMsg.db").write_bytes(b"x")
-
-        # Create second wxid folder
-        wxid_folder2 = wechat_files / "wxid_second"
-        msg_dir2 = wxid_folder2 / "Msg"
-        msg_dir2.mkdir(parents=True)
-        (msg_dir2 / "MicroMsg.db").write_bytes(b"x")
-
-        result = validate_wechat_dir(str(wechat_files))
+        result = validate_wechat_dir(str(wechat_tree))
         assert result is True
 
-    def test_validate_structure_with_config_dir(self, temp_dir):
+    def test_validate_structure_with_config_dir(self, wechat_tree):
         """Test validation with config directory"""
-        wechat_files = temp_dir / "WeChat Files"
-        wxid_folder = wechat_files / "wxid_jkl012"
-        msg_dir = wxid_folder / "Msg"
-        config_dir = wxid_folder / "config"
+        assert (wechat_tree / "wxid_alpha" / "config").is_dir()
 
-        msg_dir.mkdir(parents=True)
-        config_dir.mkdir(parents=True)
-
-        (msg_dir / "MicroMsg.db").write_bytes(b"x")
-        (msg_dir / "MSG0.db").touch()
-
-        result = validate_wechat_dir(str(wechat_files))
+        result = validate_wechat_dir(str(wechat_tree))
         assert result is True
 
 
 class TestFindWxidFolders:
     """Tests for get_wxid_folders function"""
 
-    def test_find_single_wxid_folder(self, temp_dir):
+    def test_find_single_wxid_folder(self, mock_wechat_dir):
         """Test finding single wxid folder"""
-        wechat_files = temp_dir / "WeChat Files"
-        wxid_folder = wechat_files / "wxid_mno345"
-        msg_dir = wxid_folder / "Msg"
-        msg_dir.mkdir(parents=True)
-        (msg_dir / "MicroMsg.db").write_bytes(b"x")
-
-        folders = get_wxid_folders(str(wechat_files))
+        folders = get_wxid_folders(str(mock_wechat_dir.parent))
         assert len(folders) == 1
-        assert str(wxid_folder) in folders
+        assert str(mock_wechat_dir) in folders
 
-    def test_find_multiple_wxid_folders(self, temp_dir):
+    def test_find_multiple_wxid_folders(self, wechat_tree):
         """Test finding multiple wxid folders"""
-        wechat_files = temp_dir / "WeChat Files"
-
-        wxid_names = ["wxid_alpha", "wxid_beta", "wxid_gamma"]
-        for wxid_name in wxid_names:
-            wxid_folder = wechat_files / wxid_name
-            msg_dir = wxid_folder / "Msg"
-            msg_dir.mkdir(parents=True)
-            (msg_dir / "MicroMsg.db").write_bytes(b"x")
-
-        folders = get_wxid_folders(str(wechat_files))
-        assert len(folders) == 3
-        # Verify all wxid folders are found
-        for wxid_name in wxid_names:
-            assert any(wxid_name in folder for folder in folders)
+        folders = get_wxid_folders(str(wechat_tree))
+        expected = {str(wechat_tree / wxid_name) for wxid_name in WECHAT_TREE_WXIDS}
+        assert len(folders) == len(WECHAT_TREE_WXIDS)
+        assert set(folders) == expected
 
-    def test_find_wxid_folders_sorted(self, temp_dir):
+    def test_find_wxid_folders_sorted(self, wechat_tree):
         """Test that wxid folders are returned sorted"""
-        wechat_files = temp_dir / "WeChat Files"
-
-        wxid_names = ["wxid_zzz", "wxid_aaa", "wxid_mmm"]
-        for wxid_name in wxid_names:
-            wxid_folder = wechat_files / wxid_name
-            msg_dir = wxid_folder / "Msg"
-            msg_dir.mkdir(parents=True)
-            (msg_dir / "MicroMsg.db").write_bytes(b"x")
-
-        folders = get_wxid_folders(str(wechat_files))
+        folders = get_wxid_folders(str(wechat_tree))
         # Convert to comparable paths
         folder_names = [Path(f).name for f in folders]
-        expected_order = sorted(wxid_names)
+        expected_order = sorted(WECHAT_TREE_WXIDS)
         assert folder_names == expected_order
 
     def test_find_wxid_folders_empty_dir(self, temp_dir):
@@ -246,16 +206,13 @@ class TestGetMsgDir:
         expected = str(wxid_path / "Msg")
         assert msg_path == expected
 
-    def test_get_msg_dir_with_existing_structure(self, temp_dir):
+    def test_get_msg_dir_with_existing_structure(self, wechat_tree):
         """Test getting Msg directory for existing structure"""
-        wxid_path = temp_dir / "wxid_stu901"
-        msg_dir = wxid_path / "Msg"
-        msg_dir.mkdir(parents=True)
-        (msg_dir / "MicroMsg.db").write_bytes(b"x")
+        wxid_path = wechat_tree / "wxid_alpha"
 
         msg_path = get_msg_dir(str(wxid_path))
 
-        assert msg_path == str(msg_dir)
+        assert msg_path == str(wxid_path / "Msg")
         assert Path(msg_path).exists()
 
 
@@ -265,8 +222,6 @@ class TestGetCurrentDir:
     def test_get_current_dir_not_set(self):
         """Test getting current directory when none is set"""
         # Reset global state
-        from wechat_manager.core import wechat_dir as wechat_dir_module
-
         wechat_dir_module._current_wechat_dir = None
 
         result = get_current_wechat_dir()
@@ -8,7 +8,7 @@ and chat extraction/hiding functionality.
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+import importlib
 import os
 from pathlib import Path
 
@@ -24,38 +24,35 @@ PROJECT_ROOT = Path(__file__).parent.parent.parent
 # Frontend directory
 FRONTEND_DIR = PROJECT_ROOT / "frontend"
 
-# Only mount static files if frontend directory exists
-if FRONTEND_DIR.exists():
-    # Mount static files
-    app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
-    # Mount css and js for relative paths in index.html
-    if (FRONTEND_DIR / "css").exists():
-        app.mount("/css", StaticFiles(directory=str(FRONTEND_DIR / "css")), name="css")
-    if (FRONTEND_DIR / "js").exists():
-        app.mount("/js", StaticFiles(directory=str(FRONTEND_DIR / "js")), name="js")
-
-
-@app.get("/")
-async def root():
-    """Serve the frontend index.html"""
-    index_path = FRONTEND_DIR / "index.html"
-    if index_path.exists():
-        return FileResponse(str(index_path))
-    return {"message": "WeChat Chat Manager API", "docs": "/docs"}
-
-
 @app.get("/api/health")
 async def health():
     """Health check endpoint"""
     return {"status": "ok"}
 
 
-# Include routers
-from wechat_manager.api.routes import auth, wechat, contacts, mode_a, search, export
+# Include routers: (module under wechat_manager.api.routes, prefix, tag)
+ROUTER_SPECS = (
+    ("auth", "/api/auth", "auth"),
+    ("wechat", "/api/wechat", "wechat"),
+    ("contacts", "/api/contacts", "contacts"),
+    ("mode_a", "/api/mode-a", "mode-a"),
+    ("search", "/api/search", "search"),
+    ("export", "/api/export", "export"),
+)
 
-app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
-app.include_router(wechat.router, prefix="/api/wechat", tags=["wechat"])
-app.include_router(contacts.router, prefix="/api/contacts", tags=["contacts"])
-app.include_router(mode_a.router, prefix="/api/mode-a", tags=["mode-a"])
-app.include_router(search.router, prefix="/api/search", tags=["search"])
-app.include_router(export.router, prefix="/api/export", tags=["export"])
+for _module_name, _prefix, _tag in ROUTER_SPECS:
+    _module = importlib.import_module(f"wechat_manager.api.routes.{_module_name}")
+    app.include_router(_module.router, prefix=_prefix, tags=[_tag])
+
+# The frontend is mounted last: a "/" mount matches every path, so all API
+# routes must be registered before it. html=True serves index.html for "/".
+if (FRONTEND_DIR / "index.html").exists():
+    app.mount(
+        "/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="frontend"
+    )
+else:
+
+    @app.get("/")
+    async def root():
+        """API banner when the frontend is not bundled"""
+        return {"message": "WeChat Chat Manager API", "docs": "/docs"}
@@ -1,12 +1,14 @@
-"""API 路由模块"""
+"""API 路由模块
 
-from wechat_manager.api.routes import (
-    auth,
-    wechat,
-    contacts,
-    mode_a,
-    search,
-    export,
-)
+路由子模块按需导入（PEP 562 模块级 __getattr__），导入本包不会加载全部路由
+"""
+
+import importlib
 
 __all__ = ["auth", "wechat", "contacts", "mode_a", "search", "export"]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
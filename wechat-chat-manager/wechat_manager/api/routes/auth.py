@@ -8,7 +8,10 @@ Provides endpoints for password management:
 - Change password
 """
 
-from fastapi import APIRouter, HTTPException
+from functools import lru_cache
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from wechat_manager.core.auth import AuthManager
@@ -17,6 +20,12 @@ from wechat_manager.core.auth import AuthManager
 router = APIRouter()
 
 
+@lru_cache(maxsize=1)
+def get_auth() -> AuthManager:
+    """Get the process-wide AuthManager (it keeps no per-request state)"""
+    return AuthManager()
+
+
 class PasswordRequest(BaseModel):
     """Request model for password operations"""
 
@@ -43,17 +52,26 @@ class AuthSuccessResponse(BaseModel):
     message: str
 
 
+# The success bodies never change: build them once. FastAPI passes model
+# instances through without validating them again on every request.
+_SETUP_OK = AuthSuccessResponse(success=True, message="Password set successfully")
+_LOGIN_OK = AuthSuccessResponse(success=True, message="Login successful")
+_CHANGE_OK = AuthSuccessResponse(
+    success=True, message="Password changed successfully"
+)
+
+
 @router.get("/status", response_model=AuthStatusResponse)
-async def auth_status():
+async def auth_status(auth: AuthManager = Depends(get_auth)):
     """Check if password is set"""
-    auth = AuthManager()
-    return {"is_set": auth.is_password_set()}
+    return AuthStatusResponse.model_construct(is_set=auth.is_password_set())
 
 
 @router.post("/setup", response_model=AuthSuccessResponse)
-async def setup_password(req: PasswordRequest):
+async def setup_password(
+    req: PasswordRequest, auth: AuthManager = Depends(get_auth)
+):
     """Set initial password (only works if no password is set)"""
-    auth = AuthManager()
 
     if auth.is_password_set():
         raise HTTPException(
@@ -66,33 +84,34 @@ async def setup_password(req: PasswordRequest):
             status_code=400, detail="Password must be at least 4 characters long"
         )
 
-    success = auth.set_password(req.password)
+    # scrypt hashing is CPU-bound; keep it off the event loop
+    success = await run_in_threadpool(auth.set_password, req.password)
     if success:
-        return {"success": True, "message": "Password set successfully"}
+        return _SETUP_OK
     else:
         raise HTTPException(status_code=500, detail="Failed to set password")
 
 
 @router.post("/login", response_model=AuthSuccessResponse)
-async def login(req: PasswordRequest):
+async def login(req: PasswordRequest, auth: AuthManager = Depends(get_auth)):
     """Verify password for login"""
-    auth = AuthManager()
 
     if not auth.is_password_set():
         raise HTTPException(
             status_code=400, detail="Password not set. Use /setup endpoint first."
         )
 
-    if auth.verify_password(req.password):
-        return {"success": True, "message": "Login successful"}
+    if await run_in_threadpool(auth.verify_password, req.password):
+        return _LOGIN_OK
     else:
         raise HTTPException(status_code=401, detail="Invalid password")
 
 
 @router.post("/change", response_model=AuthSuccessResponse)
-async def change_password(req: ChangePasswordRequest):
+async def change_password(
+    req: ChangePasswordRequest, auth: AuthManager = Depends(get_auth)
+):
     """Change password (requires old password verification)"""
-    auth = AuthManager()
 
     if not auth.is_password_set():
         raise HTTPException(
@@ -104,8 +123,10 @@ async def change_password(req: ChangePasswordRequest):
             status_code=400, detail="New password must be at least 4 characters long"
         )
 
-    success = auth.change_password(req.old_password, req.new_password)
+    success = await run_in_threadpool(
+        auth.change_password, req.old_password, req.new_password
+    )
     if success:
-        return {"success": True, "message": "Password changed successfully"}
+        return _CHANGE_OK
     else:
         raise HTTPException(status_code=401, detail="Invalid old password")
@@ -7,9 +7,11 @@ Provides endpoints for:
 - List extracted (hidden) contacts from encrypted storage
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+import hashlib
+from operator import attrgetter
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Iterable, Optional, List, Tuple, Type, TypeVar
 
 from wechat_manager.core import wechat_dir, key_extractor
 from wechat_manager.core.db_handler import WeChatDBHandler
@@ -55,25 +57,79 @@ class ChatRoomListResponse(BaseModel):
     count: int
 
 
+# Fields copied from core models into each response item; attrgetter fetches
+# them all in one C-level call instead of one attribute lookup per field
+_WECHAT_CONTACT_FIELDS = (
+    "id",
+    "username",
+    "nickname",
+    "alias",
+    "remark",
+    "contact_type",
+)
+_EXTRACTED_CONTACT_FIELDS = (
+    "id",
+    "username",
+    "nickname",
+    "remark",
+    "contact_type",
+    "hidden_at",
+)
+_CHATROOM_FIELDS = ("name", "members", "nickname")
+
+_ResponseT = TypeVar("_ResponseT", bound=BaseModel)
+
+
+def _construct_all(
+    model: Type[_ResponseT], fields: Tuple[str, ...], items: Iterable
+) -> List[_ResponseT]:
+    """Build response models from trusted core objects without re-validation"""
+    get = attrgetter(*fields)
+    return [model.model_construct(**dict(zip(fields, get(i)))) for i in items]
+
+
+def _etag(kind: str, fingerprint: tuple) -> str:
+    """Weak ETag for a list backed by a database file with this fingerprint"""
+    digest = hashlib.md5(
+        repr((kind, fingerprint)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Attach validators to the response; True if the client copy is current"""
+    # no-cache: the UI always revalidates, so changes show up immediately
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def _not_modified_response(response: Response) -> Response:
+    return Response(status_code=304, headers=dict(response.headers))
+
+
 @router.get("/", response_model=ContactListResponse)
-async def list_contacts(db_handler: WeChatDBHandler = Depends(get_db_handler)):
+async def list_contacts(
+    request: Request,
+    response: Response,
+    db_handler: WeChatDBHandler = Depends(get_db_handler),
+):
     """Get contacts from WeChat database"""
     try:
+        etag = _etag("contacts", db_handler.contacts_db_fingerprint())
+        if _not_modified(request, response, etag):
+            return _not_modified_response(response)
+
         contacts = db_handler.get_contacts()
-        return {
-            "contacts": [
-                {
-                    "id": c.id,
-                    "username": c.username,
-                    "nickname": c.nickname,
-                    "alias": c.alias,
-                    "remark": c.remark,
-                    "contact_type": c.contact_type,
-                }
-                for c in contacts
-            ],
-            "count": len(contacts),
-        }
+        # Data comes from our own models: build the response models directly
+        # with model_construct so FastAPI does not re-validate every item
+        return ContactListResponse.model_construct(
+            contacts=_construct_all(ContactResponse, _WECHAT_CONTACT_FIELDS, contacts),
+            count=len(contacts),
+        )
     except (InvalidKeyError, DecryptionError, ValueError) as e:
         raise HTTPException(status_code=400, detail=f"Failed to get contacts: {str(e)}")
     except Exception as e:
@@ -81,21 +137,22 @@ async def list_contacts(db_handler: WeChatDBHandler = Depends(get_db_handler)):
 
 
 @router.get("/chatrooms", response_model=ChatRoomListResponse)
-async def list_chatrooms(db_handler: WeChatDBHandler = Depends(get_db_handler)):
+async def list_chatrooms(
+    request: Request,
+    response: Response,
+    db_handler: WeChatDBHandler = Depends(get_db_handler),
+):
     """Get chatrooms from WeChat database"""
     try:
+        etag = _etag("chatrooms", db_handler.contacts_db_fingerprint())
+        if _not_modified(request, response, etag):
+            return _not_modified_response(response)
+
         chatrooms = db_handler.get_chatrooms()
-        return {
-            "chatrooms": [
-                {
-                    "name": c.name,
-                    "members": c.members,
-                    "nickname": c.nickname,
-                }
-                for c in chatrooms
-            ],
-            "count": len(chatrooms),
-        }
+        return ChatRoomListResponse.model_construct(
+            chatrooms=_construct_all(ChatRoomResponse, _CHATROOM_FIELDS, chatrooms),
+            count=len(chatrooms),
+        )
     except (InvalidKeyError, DecryptionError, ValueError) as e:
         raise HTTPException(
             status_code=400, detail=f"Failed to get chatrooms: {str(e)}"
@@ -107,24 +164,24 @@ async def list_chatrooms(db_handler: WeChatDBHandler = Depends(get_db_handler)):
 
 
 @router.get("/extracted", response_model=ContactListResponse)
-async def list_extracted(storage: EncryptedStorage = Depends(get_storage)):
+async def list_extracted(
+    request: Request,
+    response: Response,
+    storage: EncryptedStorage = Depends(get_storage),
+):
     """List extracted (hidden) contacts from encrypted storage"""
     try:
+        etag = _etag("extracted", storage.data_fingerprint())
+        if _not_modified(request, response, etag):
+            return _not_modified_response(response)
+
         contacts = storage.list_contacts()
-        return {
-            "contacts": [
-                {
-                    "id": c.id,
-                    "username": c.username,
-                    "nickname": c.nickname,
-                    "remark": c.remark,
-                    "contact_type": c.contact_type,
-                    "hidden_at": c.hidden_at,
-                }
-                for c in contacts
-            ],
-            "count": len(contacts),
-        }
+        return ContactListResponse.model_construct(
+            contacts=_construct_all(
+                ContactResponse, _EXTRACTED_CONTACT_FIELDS, contacts
+            ),
+            count=len(contacts),
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to get extracted contacts: {str(e)}"
@@ -7,7 +7,11 @@ Provides FastAPI dependency injection for:
 - ModeA instances
 """
 
+import os
+import time
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional, Tuple
 from fastapi import HTTPException
 
 from wechat_manager.core.config import load_config
@@ -24,6 +28,11 @@ DEFAULT_BACKUP_PATH = Path.home() / ".wechat_manager" / "backups"
 # Default password for storage (in production, use user's auth password)
 DEFAULT_STORAGE_PASSWORD = "wechat_manager_default_key"
 
+# How long a wxid folder scan is reused. Adding or removing an account folder
+# changes the root's mtime and refreshes sooner; the TTL bounds how long a
+# folder whose databases appear later can go unnoticed.
+WXID_SCAN_TTL = 30.0
+
 
 def get_db_handler() -> WeChatDBHandler:
     """Get WeChatDBHandler instance.
@@ -50,7 +59,7 @@ def get_db_handler() -> WeChatDBHandler:
             detail="Database key not available. Please use /api/wechat/key/manual first.",
         )
 
-    wxid_folders = wechat_dir.get_wxid_folders(root_dir)
+    wxid_folders = _get_wxid_folders(root_dir)
     if not wxid_folders:
         raise HTTPException(
             status_code=400, detail="No wxid folders found in WeChat directory."
@@ -86,26 +95,73 @@ def get_db_handler() -> WeChatDBHandler:
                 ),
             )
 
+    return _build_handler(selected, key)
+
+
+def _get_wxid_folders(root_dir: str) -> Tuple[str, ...]:
+    """wechat_dir.get_wxid_folders, reused across requests"""
+    try:
+        root_mtime: Optional[int] = os.stat(root_dir).st_mtime_ns
+    except OSError:
+        root_mtime = None
+    return _scan_wxid_folders(
+        root_dir, root_mtime, int(time.monotonic() // WXID_SCAN_TTL)
+    )
+
+
+@lru_cache(maxsize=4)
+def _scan_wxid_folders(
+    root_dir: str, root_mtime: Optional[int], ttl_bucket: int
+) -> Tuple[str, ...]:
+    # root_mtime and ttl_bucket only take part in the cache key
+    return tuple(wechat_dir.get_wxid_folders(root_dir))
+
+
+@lru_cache(maxsize=4)
+def _build_handler(selected: str, key: str) -> WeChatDBHandler:
+    """One handler per (account, key), so decrypted DB copies are reused
+    across requests instead of being decrypted again every time."""
     return WeChatDBHandler(selected, key)
 
 
+def reset_db_handlers() -> None:
+    """Drop cached handlers (and their decrypted copies), e.g. on key change."""
+    _build_handler.cache_clear()
+
+
 def get_storage() -> EncryptedStorage:
-    """Get EncryptedStorage instance.
+    """Get the process-wide EncryptedStorage instance.
 
     Creates storage directory if it doesn't exist.
     Uses default password for MVP (should use user's password in production).
+
+    Opening storage derives the key and runs the schema/dedup pass, so it is
+    done once; the instance opens a fresh connection per operation and is
+    safe to share between requests. If the directory was removed at runtime
+    the instance is rebuilt, recreating the salt and schema.
     """
-    DEFAULT_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
-    return EncryptedStorage(str(DEFAULT_STORAGE_PATH), DEFAULT_STORAGE_PASSWORD)
+    if not DEFAULT_STORAGE_PATH.is_dir():
+        _open_storage.cache_clear()
+    return _open_storage()
+
+
+@lru_cache(maxsize=1)
+def _open_storage() -> EncryptedStorage:
+    return EncryptedStorage(_ensure_dir(DEFAULT_STORAGE_PATH), DEFAULT_STORAGE_PASSWORD)
 
 
 def get_export_path() -> str:
     """Get export directory path."""
-    DEFAULT_EXPORT_PATH.mkdir(parents=True, exist_ok=True)
-    return str(DEFAULT_EXPORT_PATH)
+    return _ensure_dir(DEFAULT_EXPORT_PATH)
 
 
 def get_backup_path() -> str:
     """Get backup directory path."""
-    DEFAULT_BACKUP_PATH.mkdir(parents=True, exist_ok=True)
-    return str(DEFAULT_BACKUP_PATH)
+    return _ensure_dir(DEFAULT_BACKUP_PATH)
+
+
+def _ensure_dir(path: Path) -> str:
+    """Create a default directory if it is missing, e.g. deleted at runtime"""
+    if not path.is_dir():
+        path.mkdir(parents=True, exist_ok=True)
+    return str(path)
@@ -7,10 +7,11 @@ Provides endpoints for:
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
-from pathlib import Path
+from urllib.parse import quote
 
 from wechat_manager.core.storage import EncryptedStorage
 from wechat_manager.core.export import ExportService
@@ -89,12 +90,12 @@ async def download_export(
         )
 
     try:
-        file_path = export_service.export_to_txt(contact_id)
-        filename = Path(file_path).name
-        return FileResponse(
-            path=file_path,
-            filename=filename,
+        # Stream straight from storage instead of writing a file and re-reading it
+        filename, chunks = export_service.stream_txt(contact_id)
+        return StreamingResponse(
+            chunks,
             media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": _attachment_header(filename)},
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -102,6 +103,14 @@ async def download_export(
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
+def _attachment_header(filename: str) -> str:
+    """Content-Disposition value, RFC 5987 encoded for non-ASCII names"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
 @router.post("/multiple", response_model=ExportMultipleResponse)
 async def export_multiple(
     req: ExportMultipleRequest,
@@ -112,13 +121,17 @@ async def export_multiple(
         raise HTTPException(status_code=400, detail="No contact_ids provided")
 
     try:
-        file_paths = export_service.export_multiple(req.contact_ids)
-        return {
-            "success": True,
-            "file_paths": file_paths,
-            "count": len(file_paths),
-            "message": f"Successfully exported {len(file_paths)} chats",
-        }
+        # Exports are blocking DB and file I/O; keep them off the event loop
+        file_paths = await run_in_threadpool(
+            export_service.export_multiple, req.contact_ids
+        )
+        # Paths come from ExportService: skip re-validating each string
+        return ExportMultipleResponse.model_construct(
+            success=True,
+            file_paths=file_paths,
+            count=len(file_paths),
+            message=f"Successfully exported {len(file_paths)} chats",
+        )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -7,6 +7,8 @@ Provides endpoints for:
 """
 
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from operator import attrgetter
 from pydantic import BaseModel
 from typing import Optional, List
 
@@ -77,6 +79,18 @@ class SyncResponse(BaseModel):
     error: Optional[str] = None
 
 
+# Message fields exposed in MessageResponse, fetched in a single attrgetter call
+_MESSAGE_FIELDS = (
+    "id",
+    "contact_id",
+    "content",
+    "create_time",
+    "is_sender",
+    "msg_type",
+)
+_message_values = attrgetter(*_MESSAGE_FIELDS)
+
+
 def get_mode_a(
     db_handler: WeChatDBHandler = Depends(get_db_handler),
     storage: EncryptedStorage = Depends(get_storage),
@@ -94,52 +108,55 @@ async def extract_chats(
     if not req.contact_ids:
         raise HTTPException(status_code=400, detail="No contact_ids provided")
 
-    results = mode_a.extract_multiple(req.contact_ids)
-
-    success_count = sum(1 for r in results if r["success"])
-    failure_count = len(results) - success_count
-    total_extracted = sum(r["message_count"] for r in results if r["success"])
-
-    return {
-        "results": [
-            {
-                "contact_id": r["contact_id"],
-                "message_count": r["message_count"],
-                "success": r["success"],
-                "error": r.get("error"),
-            }
-            for r in results
-        ],
-        "total_extracted": total_extracted,
-        "success_count": success_count,
-        "failure_count": failure_count,
-    }
+    # Extraction is blocking DB and file I/O; keep it off the event loop
+    results = await run_in_threadpool(mode_a.extract_multiple, req.contact_ids)
+
+    # One pass builds the items and the totals together
+    items = []
+    success_count = 0
+    total_extracted = 0
+    for r in results:
+        if r["success"]:
+            success_count += 1
+            total_extracted += r["message_count"]
+        items.append(
+            ExtractResultItem.model_construct(
+                contact_id=r["contact_id"],
+                message_count=r["message_count"],
+                success=r["success"],
+                error=r.get("error"),
+            )
+        )
+
+    return ExtractResponse.model_construct(
+        results=items,
+        total_extracted=total_extracted,
+        success_count=success_count,
+        failure_count=len(results) - success_count,
+    )
 
 
 @router.get("/messages/{contact_id}", response_model=MessagesResponse)
 async def get_extracted_messages(
     contact_id: str,
     limit: int = 100,
-    mode_a: ModeA = Depends(get_mode_a),
+    storage: EncryptedStorage = Depends(get_storage),
 ):
     """Get extracted messages for a contact from encrypted storage"""
-    messages = mode_a.get_extracted_messages(contact_id, limit)
-
-    return {
-        "messages": [
-            {
-                "id": m.id,
-                "contact_id": m.contact_id,
-                "content": m.content,
-                "create_time": m.create_time,
-                "is_sender": m.is_sender,
-                "msg_type": m.msg_type,
-            }
+    # Reads only local storage: no need to resolve the WeChat handler
+    messages = storage.get_messages(contact_id, limit)
+
+    # Messages come straight from storage: skip per-item re-validation
+    return MessagesResponse.model_construct(
+        messages=[
+            MessageResponse.model_construct(
+                **dict(zip(_MESSAGE_FIELDS, _message_values(m)))
+            )
             for m in messages
         ],
-        "count": len(messages),
-        "contact_id": contact_id,
-    }
+        count=len(messages),
+        contact_id=contact_id,
+    )
 
 
 @router.delete(
@@ -176,10 +193,10 @@ async def sync_messages(
 @router.get("/check/{contact_id}")
 async def check_extracted(
     contact_id: str,
-    mode_a: ModeA = Depends(get_mode_a),
+    storage: EncryptedStorage = Depends(get_storage),
 ):
     """Check if a contact has already been extracted"""
-    is_extracted = mode_a.is_contact_extracted(contact_id)
+    is_extracted = storage.get_contact(contact_id) is not None
     return {
         "contact_id": contact_id,
         "is_extracted": is_extracted,
@@ -17,6 +17,7 @@ from wechat_manager.core.config import load_config, set_active_wxid, set_root_pa
 from wechat_manager.core import wechat_dir
 from wechat_manager.core import key_extractor
 from wechat_manager.core.decrypt import verify_key
+from wechat_manager.api.routes.dependencies import reset_db_handlers
 
 
 router = APIRouter()
@@ -102,6 +103,8 @@ async def detect_wechat_dir():
             "wxid_folders": wxid_folders,
         }
     else:
+        # Don't memoize a miss: WeChat may be installed before the next try
+        wechat_dir.auto_detect_wechat_dir.cache_clear()
         return {
             "success": False,
             "path": None,
@@ -275,6 +278,8 @@ async def set_manual_key(req: ManualKeyRequest):
             )
 
         key_extractor.set_manual_key(key_norm)
+        # 旧密钥对应的处理器及其解密副本不再需要
+        reset_db_handlers()
         return {
             "success": True,
             "message": "Key set successfully",
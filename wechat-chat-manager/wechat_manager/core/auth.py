@@ -3,22 +3,68 @@ Password authentication module for app protection
 Uses scrypt hashing with keyring for secure credential storage
 """
 
+import hashlib
 import os
+import threading
+import time
 import keyring
 from Crypto.Protocol.KDF import scrypt
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 SERVICE_NAME = "wechat_chat_manager"
 HASH_KEY = "app_password_hash"
 SALT_KEY = "app_password_salt"
+SCRYPT_N_KEY = "app_password_scrypt_n"
+
+# scrypt CPU/memory cost. Hashes stored before the cost was recorded used this
+# value; ops can raise (or lower) it for new hashes via the environment.
+DEFAULT_SCRYPT_N = 2**14
+SCRYPT_N_ENV = "WECHAT_MANAGER_SCRYPT_N"
+
+# HASH_KEY holds "scrypt$<N>$<salt hex>$<hash hex>", written in one keyring
+# call so a failed write can never leave a hash next to the wrong salt or N.
+# Older installs store only the hash hex there, with SALT_KEY/SCRYPT_N_KEY.
+HASH_SCHEME = "scrypt"
+
+
+def _parse_scrypt_n(value: Optional[str]) -> int:
+    """scrypt N from a stored/configured string, or the default if invalid"""
+    try:
+        n = int(value) if value else DEFAULT_SCRYPT_N
+    except ValueError:
+        return DEFAULT_SCRYPT_N
+    # scrypt requires a power of two greater than 1
+    if n < 2 or n & (n - 1):
+        return DEFAULT_SCRYPT_N
+    return n
+
+
+def _scrypt_n_from_env() -> int:
+    """scrypt N from the environment, or the default if unset/invalid"""
+    return _parse_scrypt_n(os.environ.get(SCRYPT_N_ENV))
 
 
 class AuthManager:
     """Manages app password authentication with secure hashing"""
 
-    def __init__(self):
-        """Initialize auth manager"""
-        pass
+    # Seconds a successful verification is remembered (skips scrypt)
+    VERIFY_CACHE_TTL = 30.0
+
+    def __init__(self, scrypt_n: Optional[int] = None):
+        """Initialize auth manager
+
+        Args:
+            scrypt_n: scrypt cost for new hashes (default: from environment)
+        """
+        self.scrypt_n = scrypt_n or _scrypt_n_from_env()
+        # One instance is shared across requests; serialize the
+        # check-then-write sequences in set/change. Re-entrant because
+        # change_password verifies (and may rehash) while holding it.
+        self._write_lock = threading.RLock()
+        # (sha256(salt + password), stored hash) -> expiry (monotonic).
+        # Keyed on the stored hash, so a password change invalidates it.
+        self._verify_cache: Dict[Tuple[bytes, str], float] = {}
+        self._verify_cache_lock = threading.Lock()
 
     def is_password_set(self) -> bool:
         """Check if app password has been configured"""
@@ -34,14 +80,10 @@ class AuthManager:
         Returns:
             True if password was set, False if already set
         """
-        if self.is_password_set():
-            return False
-
-        salt = os.urandom(16)
-        hashed = self._hash_password(password, salt)
-        keyring.set_password(SERVICE_NAME, HASH_KEY, hashed.hex())
-        keyring.set_password(SERVICE_NAME, SALT_KEY, salt.hex())
-        return True
+        with self._write_lock:
+            if self.is_password_set():
+                return False
+            return self._force_set_password(password)
 
     def verify_password(self, password: str) -> bool:
         """
@@ -54,14 +96,39 @@ class AuthManager:
             True if password matches, False otherwise
         """
         stored_hash = keyring.get_password(SERVICE_NAME, HASH_KEY)
-        stored_salt = keyring.get_password(SERVICE_NAME, SALT_KEY)
+        parsed = self._load_stored_hash(stored_hash)
+        if parsed is None:
+            return False
+
+        n, salt, expected, legacy = parsed
+        cache_key = (hashlib.sha256(salt + password.encode()).digest(), stored_hash)
+        now = time.monotonic()
+        with self._verify_cache_lock:
+            expiry = self._verify_cache.get(cache_key)
+        if expiry is not None and expiry > now:
+            return True
 
-        if not stored_hash or not stored_salt:
+        hashed = self._hash_password(password, salt, n)
+        if hashed.hex() != expected:
             return False
 
-        salt = bytes.fromhex(stored_salt)
-        hashed = self._hash_password(password, salt)
-        return hashed.hex() == stored_hash
+        if legacy or n != self.scrypt_n:
+            # Old layout or a different cost: upgrade it while we know the
+            # password. The new hash would not match this cache key anyway.
+            with self._write_lock:
+                # Skip if the password changed since we read it; rehashing
+                # would put the old password back
+                if keyring.get_password(SERVICE_NAME, HASH_KEY) == stored_hash:
+                    self._force_set_password(password)
+            return True
+
+        with self._verify_cache_lock:
+            # Drop expired entries so the cache stays tiny
+            self._verify_cache = {
+                k: exp for k, exp in self._verify_cache.items() if exp > now
+            }
+            self._verify_cache[cache_key] = now + self.VERIFY_CACHE_TTL
+        return True
 
     def change_password(self, old_password: str, new_password: str) -> bool:
         """
@@ -74,33 +141,72 @@ class AuthManager:
         Returns:
             True if password was changed, False if old password incorrect
         """
-        if not self.verify_password(old_password):
-            return False
+        with self._write_lock:
+            if not self.verify_password(old_password):
+                return False
+
+            # A single write replaces the old hash, salt and cost together
+            return self._force_set_password(new_password)
+
+    def _load_stored_hash(
+        self, stored_hash: Optional[str]
+    ) -> Optional[Tuple[int, bytes, str, bool]]:
+        """
+        Parse the stored hash into (scrypt N, salt, hash hex, is legacy)
 
-        # Delete old and set new
-        self._clear_password()
-        return self._force_set_password(new_password)
+        Args:
+            stored_hash: The HASH_KEY value from the keyring
 
-    def _hash_password(self, password: str, salt: bytes) -> bytes:
+        Returns:
+            The parsed fields, or None if no usable hash is stored
+        """
+        if not stored_hash:
+            return None
+        try:
+            if "$" in stored_hash:
+                scheme, n, salt_hex, hash_hex = stored_hash.split("$")
+                if scheme != HASH_SCHEME:
+                    return None
+                return _parse_scrypt_n(n), bytes.fromhex(salt_hex), hash_hex, False
+
+            stored_salt = keyring.get_password(SERVICE_NAME, SALT_KEY)
+            if not stored_salt:
+                return None
+            stored_n = keyring.get_password(SERVICE_NAME, SCRYPT_N_KEY)
+            n = _parse_scrypt_n(stored_n)
+            return n, bytes.fromhex(stored_salt), stored_hash, True
+        except ValueError:
+            return None
+
+    def _hash_password(
+        self, password: str, salt: bytes, n: Optional[int] = None
+    ) -> bytes:
         """
         Hash password using scrypt KDF
 
         Args:
             password: The password to hash
             salt: The salt bytes (16 bytes recommended)
+            n: scrypt cost factor (default: self.scrypt_n)
 
         Returns:
             Hashed password bytes
         """
-        return scrypt(password.encode(), salt, key_len=32, N=2**14, r=8, p=1)
+        return scrypt(
+            password.encode(), salt, key_len=32, N=n or self.scrypt_n, r=8, p=1
+        )
 
     def _clear_password(self):
         """Clear stored password (internal use)"""
-        try:
-            keyring.delete_password(SERVICE_NAME, HASH_KEY)
-            keyring.delete_password(SERVICE_NAME, SALT_KEY)
-        except keyring.errors.PasswordDeleteError:
-            pass
+        self._delete_entries(HASH_KEY, SALT_KEY, SCRYPT_N_KEY)
+
+    def _delete_entries(self, *keys: str):
+        """Delete keyring entries, skipping any that do not exist"""
+        for key in keys:
+            try:
+                keyring.delete_password(SERVICE_NAME, key)
+            except keyring.errors.PasswordDeleteError:
+                pass
 
     def _force_set_password(self, password: str) -> bool:
         """
@@ -114,6 +220,11 @@ class AuthManager:
         """
         salt = os.urandom(16)
         hashed = self._hash_password(password, salt)
-        keyring.set_password(SERVICE_NAME, HASH_KEY, hashed.hex())
-        keyring.set_password(SERVICE_NAME, SALT_KEY, salt.hex())
+        keyring.set_password(
+            SERVICE_NAME,
+            HASH_KEY,
+            f"{HASH_SCHEME}${self.scrypt_n}${salt.hex()}${hashed.hex()}",
+        )
+        # Legacy entries are no longer read once HASH_KEY is self-contained
+        self._delete_entries(SALT_KEY, SCRYPT_N_KEY)
         return True
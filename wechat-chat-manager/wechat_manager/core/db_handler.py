@@ -8,6 +8,7 @@
 import os
 import re
 import sqlite3
+import threading
 import hashlib
 import importlib
 from pathlib import Path
@@ -21,6 +22,10 @@ from wechat_manager.core.decrypt import (
 )
 from wechat_manager.models.chat import ChatRoom, Contact, Message
 
+# 除 \t \n \r 之外的 C0 控制字符
+_CONTROL_CHARS = "".join(chr(c) for c in range(32) if chr(c) not in "\t\n\r")
+_CONTROL_CHARS_RE = re.compile(f"[{re.escape(_CONTROL_CHARS)}]")
+
 
 class WeChatDBHandler:
     """微信数据库处理器
@@ -53,8 +58,13 @@ class WeChatDBHandler:
             # Legacy Msg layout
             self._version_hint = 3
 
-        # Cache decrypted DB file paths
+        # Cache decrypted DB file paths, with the source fingerprint each
+        # copy was made from; a handler may live across many requests
         self._decrypted_cache: Dict[str, str] = {}
+        self._source_fingerprints: Dict[str, tuple] = {}
+        # 被新副本替换的旧副本：可能仍有连接在读，清理缓存时再删除
+        self._stale_copies: List[str] = []
+        self._decrypt_lock = threading.Lock()
 
     def __del__(self):
         """清理临时解密文件"""
@@ -64,13 +74,15 @@ class WeChatDBHandler:
         """清理所有缓存的解密文件"""
         if not hasattr(self, "_decrypted_cache"):
             return
-        for decrypted_path in self._decrypted_cache.values():
+        for decrypted_path in [*self._decrypted_cache.values(), *self._stale_copies]:
             try:
                 if os.path.exists(decrypted_path):
                     os.remove(decrypted_path)
             except OSError:
                 pass
         self._decrypted_cache.clear()
+        self._source_fingerprints.clear()
+        self._stale_copies.clear()
 
     @staticmethod
     def _validate_key(key: str) -> None:
@@ -85,9 +97,12 @@ class WeChatDBHandler:
         if not key or len(key) != 64:
             raise ValueError("密钥必须是64个十六进制字符")
 
-        # 检查是否都是十六进制字符
-        if not re.match(r"^[0-9a-fA-F]{64}$", key):
-            raise ValueError("密钥必须是64个十六进制字符")
+        # 检查是否都是十六进制字符（64 字符必须恰好解码为 32 字节）
+        try:
+            if len(bytes.fromhex(key)) != 32:
+                raise ValueError
+        except ValueError:
+            raise ValueError("密钥必须是64个十六进制字符") from None
 
     def connect(self, db_path: str) -> sqlite3.Connection:
         """连接到数据库（自动处理加密）
@@ -105,21 +120,69 @@ class WeChatDBHandler:
             DecryptionError: 解密失败
             InvalidKeyError: 密钥无效
         """
-        # 检查是否已经解密过
-        if db_path in self._decrypted_cache:
-            return sqlite3.connect(self._decrypted_cache[db_path])
+        fingerprint = self._source_fingerprint(db_path)
+        with self._decrypt_lock:
+            # 已解密且源文件未变化时直接复用
+            cached = self._decrypted_cache.get(db_path)
+            if (
+                cached is not None
+                and self._source_fingerprints.get(db_path) == fingerprint
+            ):
+                return self._open_snapshot(cached)
+
+            # 检查是否是加密数据库
+            if not is_encrypted_database(db_path):
+                # 未加密的数据库（测试用），直接连接
+                return self._open(db_path)
 
-        # 检查是否是加密数据库
-        if is_encrypted_database(db_path):
-            # 解密到临时文件
+            # 解密到临时文件（源文件有新数据时替换旧副本）
             decrypted_path = decrypt_database(
                 self.key, db_path, version_hint=self._version_hint
             )
+            if cached is not None:
+                # 之前打开的快照连接可能仍在读旧副本，不能立即删除
+                self._stale_copies.append(cached)
             self._decrypted_cache[db_path] = decrypted_path
-            return sqlite3.connect(decrypted_path)
-        else:
-            # 未加密的数据库（测试用），直接连接
-            return sqlite3.connect(db_path)
+            self._source_fingerprints[db_path] = fingerprint
+        return self._open_snapshot(decrypted_path)
+
+    @staticmethod
+    def _source_fingerprint(db_path: str) -> tuple:
+        """源库及其 -wal 文件的 (大小, 修改时间)，用于判断解密副本是否过期"""
+        fingerprint = []
+        for path in (db_path, db_path + "-wal"):
+            try:
+                st = os.stat(path)
+            except OSError:
+                fingerprint.append(None)
+            else:
+                fingerprint.append((st.st_size, st.st_mtime_ns))
+        return tuple(fingerprint)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        # WAL 模式下提交无需每次 fsync；rollback 日志模式下同样安全
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _open_snapshot(path: str) -> sqlite3.Connection:
+        """只读打开解密副本
+
+        副本写出后不再修改（源库变化时会换成新文件），以 immutable 方式打开
+        可跳过文件锁与变更检测，多个请求并发读取时互不阻塞
+        """
+        uri = Path(path).resolve().as_uri() + "?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA cache_size=-64000")
+        return conn
+
+    def contacts_db_fingerprint(self) -> tuple:
+        """联系人库的 (路径, 源文件指纹)，联系人/群聊列表变化时随之改变"""
+        db_path = str(self._get_contacts_db_path())
+        return (db_path, self._source_fingerprint(db_path))
 
     def _get_contacts_db_path(self) -> Path:
         # Prefer V4 db_storage layout if present and non-empty
@@ -210,13 +273,8 @@ class WeChatDBHandler:
     def _looks_garbled(text: str) -> bool:
         if not text:
             return True
-        bad = 0
-        for ch in text:
-            code = ord(ch)
-            if code < 32 and ch not in ("\n", "\r", "\t"):
-                bad += 1
-            if ch == "\ufffd":
-                bad += 3
+        # 用预编译正则和 str.count 在 C 层扫描，代替逐字符的 Python 循环
+        bad = len(_CONTROL_CHARS_RE.findall(text)) + 3 * text.count("\ufffd")
         return bad > max(3, len(text) // 5)
 
     def _sanitize_content(
@@ -296,7 +354,7 @@ class WeChatDBHandler:
         except Exception:
             return ""
 
-        text = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", text).strip()
+        text = _CONTROL_CHARS_RE.sub("", text).strip()
         if not text:
             return ""
 
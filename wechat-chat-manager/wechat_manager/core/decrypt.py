@@ -7,15 +7,28 @@ Supported profiles:
 - V4 (Weixin 4.x): PBKDF2-HMAC-SHA512 (256000), HMAC-SHA512, reserve=80
 """
 
+import functools
 import hashlib
+import importlib
 import hmac
+import mmap
+import os
 import struct
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dataclasses import dataclass, replace
-from typing import Optional, Tuple, Literal
+from typing import Any, Optional, Tuple, Literal
 
 from Crypto.Cipher import AES
+from Crypto.Util.strxor import strxor
+
+try:
+    # 可选依赖：fastpbkdf2 的 SHA1/SHA512 实现比 hashlib 快，接口相同
+    from fastpbkdf2 import pbkdf2_hmac as _pbkdf2_hmac
+except ImportError:
+    _pbkdf2_hmac = hashlib.pbkdf2_hmac
 
 # SQLite 文件头
 SQLITE_FILE_HEADER = b"SQLite format 3\x00"
@@ -28,6 +41,15 @@ HMAC_SIZE = 20  # SHA1
 IV_SIZE = 16
 RESERVED_SIZE = 48  # IV(16) + HMAC(20) + padding(12)
 
+# 批量解密时每批处理的页数 (约 1MB)，限制中间缓冲区大小
+_DECRYPT_BATCH_PAGES = 256
+
+# 并行解密批次的最大线程数
+_DECRYPT_MAX_WORKERS = 8
+
+# 批量 HMAC 校验时每个线程任务处理的页数
+_HMAC_CHUNK_PAGES = 1024
+
 # Weixin 4.x (SQLCipher 4 defaults)
 V4_KDF_ITER = 256000
 V4_HMAC_SIZE = 64  # SHA512
@@ -72,6 +94,48 @@ _PROFILE_V4_DEFAULT = CipherProfile(
 )
 
 
+# HMAC ipad/opad 异或转换表 (同标准库 hmac 模块)
+_TRANS_36 = bytes(x ^ 0x36 for x in range(256))
+_TRANS_5C = bytes(x ^ 0x5C for x in range(256))
+
+# HMAC 密钥的盐值为 salt ^ 0x3a
+_TRANS_3A = bytes(x ^ 0x3A for x in range(256))
+
+
+@dataclass(frozen=True)
+class HmacCtx:
+    """预计算的 HMAC 内/外层哈希状态
+
+    HMAC(k, m) = H((k ^ opad) || H((k ^ ipad) || m))。对同一个 mac_key，
+    两个前缀块的哈希状态在所有页面间是相同的，因此只计算一次，
+    每页只需 copy() 后继续 update，避免重复处理密钥。
+    """
+
+    inner: Any
+    outer: Any
+
+    @classmethod
+    def new(cls, mac_key: bytes, digestmod: str = "sha1") -> "HmacCtx":
+        inner = hashlib.new(digestmod)
+        outer = hashlib.new(digestmod)
+        block_size = inner.block_size
+        if len(mac_key) > block_size:
+            mac_key = hashlib.new(digestmod, mac_key).digest()
+        mac_key = mac_key.ljust(block_size, b"\x00")
+        inner.update(mac_key.translate(_TRANS_36))
+        outer.update(mac_key.translate(_TRANS_5C))
+        return cls(inner=inner, outer=outer)
+
+    def digest(self, *chunks: bytes) -> bytes:
+        """计算 chunks 依次拼接后的 HMAC 摘要"""
+        inner = self.inner.copy()
+        for chunk in chunks:
+            inner.update(chunk)
+        outer = self.outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+
 class DecryptionError(Exception):
     """解密错误"""
 
@@ -85,16 +149,18 @@ class InvalidKeyError(DecryptionError):
 
 
 def _mask_salt(salt: bytes) -> bytes:
-    return bytes([b ^ 0x3A for b in salt])
+    return salt.translate(_TRANS_3A)
 
 
+# 派生密钥缓存仅保存在进程内存中，不落盘；可通过 _clear_key_cache() 清除
+@functools.lru_cache(maxsize=32)
 def _derive_keys_for_profile(
     key_hex: str, salt: bytes, profile: CipherProfile
 ) -> Tuple[bytes, bytes]:
     key_bytes = bytes.fromhex(key_hex)
 
     if profile.kdf_mode == "pbkdf2":
-        decrypt_key = hashlib.pbkdf2_hmac(
+        decrypt_key = _pbkdf2_hmac(
             profile.kdf_hash, key_bytes, salt, profile.kdf_iter, dklen=KEY_SIZE
         )
     else:
@@ -103,17 +169,22 @@ def _derive_keys_for_profile(
 
     mac_salt = _mask_salt(salt)
     if profile.mac_key_mode == "passphrase":
-        mac_key = hashlib.pbkdf2_hmac(
+        mac_key = _pbkdf2_hmac(
             profile.kdf_hash, key_bytes, mac_salt, profile.kdf_iter, dklen=KEY_SIZE
         )
     else:
-        mac_key = hashlib.pbkdf2_hmac(
+        mac_key = _pbkdf2_hmac(
             profile.kdf_hash, decrypt_key, mac_salt, 2, dklen=KEY_SIZE
         )
 
     return decrypt_key, mac_key
 
 
+def _clear_key_cache() -> None:
+    """清除已缓存的派生密钥"""
+    _derive_keys_for_profile.cache_clear()
+
+
 def _page_num_bytes(page_number: int, endian: Literal["be", "le"]) -> bytes:
     return struct.pack(">I" if endian == "be" else "<I", int(page_number))
 
@@ -150,22 +221,82 @@ def _hmac_slices(
 
 
 def _verify_hmac_for_profile(
-    mac_key: bytes, page_data: bytes, page_number: int, profile: CipherProfile
+    hmac_ctx: HmacCtx, page_data: bytes, page_number: int, profile: CipherProfile
+) -> bool:
+    return _verify_hmac_page_no(
+        hmac_ctx,
+        page_data,
+        _page_num_bytes(page_number, profile.page_num_endian),
+        profile,
+    )
+
+
+def _verify_hmac_page_no(
+    hmac_ctx: HmacCtx, page_data: bytes, page_no: bytes, profile: CipherProfile
 ) -> bool:
+    """同 _verify_hmac_for_profile，但页码已编码为 4 字节"""
     slices = _hmac_slices(page_data, profile)
     if slices is None:
         return False
     data_to_hash, expected_hmac, _iv = slices
 
-    hm = hmac.new(mac_key, digestmod=profile.hmac_hash)
-    hm.update(data_to_hash)
-    hm.update(_page_num_bytes(page_number, profile.page_num_endian))
-    digest = hm.digest()
+    digest = hmac_ctx.digest(data_to_hash, page_no)
     if len(digest) != profile.hmac_size:
         digest = digest[: profile.hmac_size]
     return hmac.compare_digest(digest, expected_hmac)
 
 
+def verify_pages_hmac(
+    hmac_ctx: HmacCtx,
+    pages: bytes,
+    first_page_number: int,
+    profile: CipherProfile = _PROFILE_V3,
+    max_workers: Optional[int] = None,
+) -> list[bool]:
+    """批量验证若干完整页面的 HMAC
+
+    各页的 HMAC 互不依赖，hashlib 在处理大块数据时会释放 GIL，
+    因此按块分发到线程池并行计算。
+
+    Args:
+        hmac_ctx: 预计算的 HMAC 状态
+        pages: 连续的完整加密页面 (末尾不完整的页面会被忽略)
+        first_page_number: pages 中第一页的页码
+        profile: 加密参数
+        max_workers: 线程数，默认为 CPU 核数
+
+    Returns:
+        每页的验证结果
+    """
+    view = memoryview(pages)
+    n_pages = len(pages) // PAGE_SIZE
+    # 页码字节一次性编码，避免每页调用 struct.pack
+    byteorder = "big" if profile.page_num_endian == "be" else "little"
+    page_nos = [
+        n.to_bytes(4, byteorder)
+        for n in range(first_page_number, first_page_number + n_pages)
+    ]
+
+    def verify_chunk(start: int) -> list[bool]:
+        end = min(start + _HMAC_CHUNK_PAGES, n_pages)
+        return [
+            _verify_hmac_page_no(
+                hmac_ctx,
+                view[i * PAGE_SIZE : (i + 1) * PAGE_SIZE],
+                page_nos[i],
+                profile,
+            )
+            for i in range(start, end)
+        ]
+
+    starts = range(0, n_pages, _HMAC_CHUNK_PAGES)
+    if len(starts) <= 1:
+        return [ok for start in starts for ok in verify_chunk(start)]
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return [ok for chunk in executor.map(verify_chunk, starts) for ok in chunk]
+
+
 def _decrypt_page_for_profile(
     decrypt_key: bytes, page_data: bytes, profile: CipherProfile
 ) -> bytes:
@@ -229,10 +360,11 @@ def _select_profile(
     for profile in _candidate_profiles(version_hint):
         try:
             _dec_key, mac_key = _derive_keys_for_profile(key_hex, salt, profile)
-            if not _verify_hmac_for_profile(mac_key, page1, 1, profile):
+            hmac_ctx = HmacCtx.new(mac_key, profile.hmac_hash)
+            if not _verify_hmac_for_profile(hmac_ctx, page1, 1, profile):
                 continue
             if page2 is not None and len(page2) == PAGE_SIZE:
-                if not _verify_hmac_for_profile(mac_key, page2, 2, profile):
+                if not _verify_hmac_for_profile(hmac_ctx, page2, 2, profile):
                     continue
             return profile
         except Exception:
@@ -251,17 +383,8 @@ def derive_keys(key_hex: str, salt: bytes) -> Tuple[bytes, bytes]:
     Returns:
         (decrypt_key, mac_key) 元组
     """
-    # 将十六进制密钥转换为字节
-    key_bytes = bytes.fromhex(key_hex)
-
-    # 使用 PBKDF2-HMAC-SHA1 派生解密密钥
-    decrypt_key = hashlib.pbkdf2_hmac("sha1", key_bytes, salt, KDF_ITER, dklen=KEY_SIZE)
-
-    # 派生 HMAC 密钥: 使用 salt XOR 0x3a 作为盐值
-    mac_salt = bytes([x ^ 0x3A for x in salt])
-    mac_key = hashlib.pbkdf2_hmac("sha1", decrypt_key, mac_salt, 2, KEY_SIZE)
-
-    return decrypt_key, mac_key
+    # PBKDF2 开销较大，相同 (key_hex, salt) 的结果会被缓存
+    return _derive_keys_for_profile(key_hex, bytes(salt), _PROFILE_V3)
 
 
 def verify_hmac(mac_key: bytes, page_data: bytes, page_number: int) -> bool:
@@ -275,18 +398,27 @@ def verify_hmac(mac_key: bytes, page_data: bytes, page_number: int) -> bool:
     Returns:
         HMAC 是否有效
     """
-    # HMAC 计算范围: 页面数据除去最后 32 字节 (HMAC + padding)
-    data_to_hash = page_data[:-32]
+    return verify_hmac_ctx(HmacCtx.new(mac_key), page_data, page_number)
 
-    # 创建 HMAC
-    hash_mac = hmac.new(mac_key, digestmod="sha1")
-    hash_mac.update(data_to_hash)
-    # 添加页面编号 (little-endian 32-bit integer)
-    hash_mac.update(struct.pack("<I", page_number))
+
+def verify_hmac_ctx(hmac_ctx: HmacCtx, page_data: bytes, page_number: int) -> bool:
+    """使用预计算的 HMAC 状态验证页面 (同一数据库的多页复用同一 ctx)
+
+    Args:
+        hmac_ctx: 由 HmacCtx.new(mac_key) 创建的 HMAC-SHA1 状态
+        page_data: 页面数据
+        page_number: 页面编号 (从 1 开始)
+
+    Returns:
+        HMAC 是否有效
+    """
+    # HMAC 计算范围: 页面数据除去最后 32 字节 (HMAC + padding)
+    # 页面编号为 little-endian 32-bit integer
+    digest = hmac_ctx.digest(page_data[:-32], struct.pack("<I", page_number))
 
     # 比较 HMAC (在 -32:-12 位置)
     expected_hmac = page_data[-32:-12]
-    return hmac.compare_digest(hash_mac.digest(), expected_hmac)
+    return hmac.compare_digest(digest, expected_hmac)
 
 
 def decrypt_page(decrypt_key: bytes, page_data: bytes, is_first_page: bool) -> bytes:
@@ -313,11 +445,122 @@ def decrypt_page(decrypt_key: bytes, page_data: bytes, is_first_page: bool) -> b
     return decrypted
 
 
+def decrypt_pages_bulk(
+    decrypt_key: bytes,
+    pages: bytes,
+    reserved_size: int = RESERVED_SIZE,
+    cipher: Any = None,
+    scratch: Optional[bytearray] = None,
+) -> bytearray:
+    """批量解密若干完整页面
+
+    CBC 解密可以拆成一次 ECB 解密再与前一密文块异或。由于页面和保留区都按
+    16 字节对齐，可以对整批页面 (含保留区) 做一次 ECB 解密、一次异或，
+    之后每页只需修正首块的 IV 并还原保留区，避免逐页创建 cipher 对象。
+
+    Args:
+        decrypt_key: 解密密钥
+        pages: 连续的完整加密页面 (长度为 PAGE_SIZE 的整数倍)
+        reserved_size: 每页末尾保留区大小 (IV + HMAC + 填充)
+        cipher: 可选，用 decrypt_key 创建好的 AES ECB 对象；批量调用时复用，
+            避免每批重新扩展密钥 (ECB 无状态，可在线程间共享)
+        scratch: 可选，ECB 解密结果的暂存缓冲区 (不小于 pages)；批量调用时复用，
+            避免每批重新分配。不可在线程间共享
+
+    Returns:
+        解密后的页面数据，每页保留原始的保留区
+    """
+    cipher_size = PAGE_SIZE - reserved_size
+    if cipher_size % 16 != 0:
+        raise DecryptionError("Ciphertext length is not a multiple of 16")
+
+    view = memoryview(pages)
+    data = view[: len(pages) - len(pages) % PAGE_SIZE]
+    if not data:
+        return bytearray()
+    offsets = range(0, len(data), PAGE_SIZE)
+
+    # 每个密文块需要异或的前一块：整体右移 16 字节，页首块改为该页 IV
+    out = bytearray(16)
+    out += data[:-16]
+    for o in offsets:
+        out[o : o + 16] = data[o + cipher_size : o + cipher_size + IV_SIZE]
+    if cipher is None:
+        cipher = AES.new(decrypt_key, AES.MODE_ECB)
+    if scratch is None or len(scratch) < len(data):
+        strxor(cipher.decrypt(data), out, output=out)
+    else:
+        with memoryview(scratch)[: len(data)] as buf:
+            cipher.decrypt(data, output=buf)
+            strxor(buf, out, output=out)
+
+    for o in offsets:
+        out[o + cipher_size : o + PAGE_SIZE] = data[o + cipher_size : o + PAGE_SIZE]
+    return out
+
+
+# 可选的 SQLCipher Python 绑定 (接口相同)，按顺序尝试导入
+_SQLCIPHER_MODULES = ("pysqlcipher3.dbapi2", "sqlcipher3.dbapi2")
+
+
+def _export_with_sqlcipher(
+    encrypted_path: Path,
+    output_path: str,
+    decrypt_key: bytes,
+    salt: bytes,
+    profile: CipherProfile,
+) -> bool:
+    """用 SQLCipher 绑定 (可选依赖) 将加密数据库导出为明文数据库
+
+    以原始密钥 (x'<key><salt>') 打开，跳过 SQLCipher 自身的 PBKDF2；SQLCipher
+    再以 salt ^ 0x3a 迭代 2 次派生 HMAC 密钥，因此只适用于 enc_key_iter2 模式。
+
+    Returns:
+        True 如果导出成功；未安装绑定或导出失败时返回 False
+    """
+    if profile.mac_key_mode != "enc_key_iter2" or profile.kdf_mode != "pbkdf2":
+        return False
+
+    for module_name in _SQLCIPHER_MODULES:
+        try:
+            sqlcipher = importlib.import_module(module_name)
+            break
+        except Exception:
+            continue
+    else:
+        return False
+
+    algorithm = profile.hmac_hash.upper()
+    pragmas = [
+        f"PRAGMA key = \"x'{decrypt_key.hex()}{salt.hex()}'\"",
+        f"PRAGMA cipher_page_size = {PAGE_SIZE}",
+        f"PRAGMA cipher_hmac_algorithm = HMAC_{algorithm}",
+        f"PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_{algorithm}",
+        f"PRAGMA cipher_hmac_pgno = {profile.page_num_endian}",
+    ]
+
+    try:
+        conn = sqlcipher.connect(str(encrypted_path))
+        try:
+            for pragma in pragmas:
+                conn.execute(pragma)
+            conn.execute("ATTACH DATABASE ? AS plain KEY ''", (output_path,))
+            conn.execute("SELECT sqlcipher_export('plain')")
+            conn.execute("DETACH DATABASE plain")
+        finally:
+            conn.close()
+    except Exception:
+        return False
+    return True
+
+
 def decrypt_database(
     key_hex: str,
     encrypted_path: str,
     output_path: Optional[str] = None,
     version_hint: Optional[int] = None,
+    verify_pages: bool = False,
+    use_sqlcipher: bool = False,
 ) -> str:
     """解密微信数据库文件
 
@@ -325,6 +568,11 @@ def decrypt_database(
         key_hex: 64 字符的十六进制密钥
         encrypted_path: 加密数据库文件路径
         output_path: 解密后文件保存路径 (可选, 默认创建临时文件)
+        version_hint: 数据库版本提示 (3 或 4)
+        verify_pages: 是否校验第一页之外每一页的 HMAC (默认跳过以提升速度)
+        use_sqlcipher: 安装了 pysqlcipher3/sqlcipher3 时改用 SQLCipher 原生导出
+            (会校验每一页 HMAC，但 sqlcipher_export 逐行重建数据库，通常比
+            按批解密慢)，失败时回退到纯 Python 实现
 
     Returns:
         解密后的数据库文件路径
@@ -338,16 +586,35 @@ def decrypt_database(
     if not encrypted_path.exists():
         raise FileNotFoundError(f"加密文件不存在: {encrypted_path}")
 
-    # 读取加密数据库
+    # 以只读内存映射方式打开加密数据库，避免把整个文件读入内存
     with open(encrypted_path, "rb") as f:
-        encrypted_data = f.read()
+        file_size = os.fstat(f.fileno()).st_size
 
-    # 检查文件大小
-    if len(encrypted_data) < PAGE_SIZE:
-        raise DecryptionError(
-            f"文件太小，不是有效的加密数据库: {len(encrypted_data)} bytes"
-        )
+        # 检查文件大小
+        if file_size < PAGE_SIZE:
+            raise DecryptionError(f"文件太小，不是有效的加密数据库: {file_size} bytes")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as encrypted_data:
+            return _decrypt_mapped(
+                key_hex,
+                encrypted_data,
+                output_path,
+                version_hint,
+                verify_pages,
+                encrypted_path if use_sqlcipher else None,
+            )
 
+
+def _decrypt_mapped(
+    key_hex: str,
+    encrypted_data: mmap.mmap,
+    output_path: Optional[str],
+    version_hint: Optional[int],
+    verify_pages: bool,
+    sqlcipher_source: Optional[Path] = None,
+) -> str:
+    # 注意：mmap 切片返回 bytes 副本。指向 mmap 的 memoryview 只作为临时参数
+    # 传递、不保存在局部变量中，否则异常回溯持有它时关闭映射会抛出 BufferError
     salt = encrypted_data[:16]
     first_page = encrypted_data[16:PAGE_SIZE]
 
@@ -356,17 +623,28 @@ def decrypt_database(
         raise InvalidKeyError("HMAC 验证失败 - 密钥或解密参数不正确")
 
     decrypt_key, mac_key = _derive_keys_for_profile(key_hex, salt, profile)
-    if not _verify_hmac_for_profile(mac_key, first_page, 1, profile):
+    hmac_ctx = HmacCtx.new(mac_key, profile.hmac_hash)
+    if not _verify_hmac_for_profile(hmac_ctx, first_page, 1, profile):
         raise InvalidKeyError("HMAC 验证失败 - 密钥或解密参数不正确")
 
+    if verify_pages:
+        results = verify_pages_hmac(
+            hmac_ctx, memoryview(encrypted_data)[PAGE_SIZE:], 2, profile
+        )
+        if not all(results):
+            raise DecryptionError(f"第 {results.index(False) + 2} 页 HMAC 验证失败")
+
     # 创建输出文件
     if output_path is None:
         # 创建临时文件
         fd, output_path = tempfile.mkstemp(suffix=".db")
-        import os
-
         os.close(fd)
 
+    if sqlcipher_source is not None and _export_with_sqlcipher(
+        sqlcipher_source, output_path, decrypt_key, salt, profile
+    ):
+        return output_path
+
     # 解密并写入输出文件
     with open(output_path, "wb") as f:
         # 解密第一页 (ciphertext only)
@@ -377,20 +655,38 @@ def decrypt_database(
         f.write(decrypted_first)
         f.write(first_page[-profile.reserved_size :])
 
-        # 处理剩余页面
-        page_number = 2
-        for offset in range(PAGE_SIZE, len(encrypted_data), PAGE_SIZE):
-            page = encrypted_data[offset : offset + PAGE_SIZE]
-            if len(page) < PAGE_SIZE:
-                # 不完整的页面，跳过
-                break
-
-            # 可选：验证每页 HMAC（开销较大），这里跳过以提升速度
-            decrypted = _decrypt_page_for_profile(decrypt_key, page, profile)
-            f.write(decrypted)
-            f.write(page[-profile.reserved_size :])
-
-            page_number += 1
+        # 处理剩余页面：按批次整体解密，末尾不完整的页面跳过
+        # 每批只从映射中复制约 1MB，峰值内存与文件大小无关
+        batch_size = PAGE_SIZE * _DECRYPT_BATCH_PAGES
+        offsets = range(PAGE_SIZE, len(encrypted_data), batch_size)
+        # AES 密钥扩展只做一次，所有批次共用；暂存缓冲区每个线程一份
+        cipher = AES.new(decrypt_key, AES.MODE_ECB)
+        local = threading.local()
+
+        def decrypt_batch(offset: int) -> bytearray:
+            scratch = getattr(local, "scratch", None)
+            if scratch is None:
+                scratch = local.scratch = bytearray(batch_size)
+            return decrypt_pages_bulk(
+                decrypt_key,
+                encrypted_data[offset : offset + batch_size],
+                profile.reserved_size,
+                cipher,
+                scratch,
+            )
+
+        if len(offsets) <= 1:
+            for offset in offsets:
+                f.write(decrypt_batch(offset))
+        else:
+            # PyCryptodome 通过 cffi 调用 C 实现，解密时会释放 GIL，
+            # 因此多个批次可在线程中并行；每轮最多 workers 个批次，按顺序写出
+            workers = min(len(offsets), os.cpu_count() or 1, _DECRYPT_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for start in range(0, len(offsets), workers):
+                    window = offsets[start : start + workers]
+                    for decrypted in executor.map(decrypt_batch, window):
+                        f.write(decrypted)
 
     return output_path
 
@@ -404,12 +700,18 @@ def is_encrypted_database(db_path: str) -> bool:
     Returns:
         True 如果文件是加密的 (不以 SQLite 文件头开始)
     """
+    # 只需要前 16 字节，直接用底层 fd 读取，避免缓冲文件对象预读整块数据
     try:
-        with open(db_path, "rb") as f:
-            header = f.read(16)
-        return not header.startswith(SQLITE_FILE_HEADER)
-    except (OSError, IOError):
+        fd = os.open(db_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except OSError:
         return False
+    try:
+        header = os.read(fd, len(SQLITE_FILE_HEADER))
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+    return header != SQLITE_FILE_HEADER
 
 
 def verify_key(key_hex: str, db_path: str, version_hint: Optional[int] = None) -> bool:
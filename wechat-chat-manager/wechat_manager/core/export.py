@@ -4,17 +4,35 @@ Export chat records to files.
 Supports exporting messages to TXT format with proper formatting and encoding.
 """
 
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 from wechat_manager.core.storage import EncryptedStorage
 from wechat_manager.models.chat import Contact, Message
 
 
+@functools.lru_cache(maxsize=4096)
+def _fmt_ts(ts: int) -> str:
+    """Format a unix timestamp as local time, cached since chats cluster in time"""
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
 class ExportService:
     """Export chat records to files"""
 
+    # Most messages written per chat
+    MESSAGE_LIMIT = 10000
+
+    # Streamed downloads are flushed in chunks of roughly this many bytes
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # Characters not allowed in filenames, all mapped to "_"
+    _SAFE_FILENAME_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', "_"))
+
     def __init__(self, storage: EncryptedStorage, export_dir: str):
         self.storage = storage
         self.export_dir = Path(export_dir)
@@ -30,16 +48,18 @@ class ExportService:
 
         Returns: Path to exported file
         """
-        contact = self.storage.get_contact(contact_id)
-        if not contact:
-            raise ValueError(f"Contact {contact_id} not found")
-
-        messages = self.storage.get_messages(contact_id, limit=10000)
-
+        contact, messages = self._load_chat(contact_id)
+        return self._write_txt_file(contact_id, contact, messages, filename)
+
+    def _write_txt_file(
+        self,
+        contact_id: str,
+        contact: Contact,
+        messages: List[Message],
+        filename: Optional[str] = None,
+    ) -> str:
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_name = self._safe_filename(contact.nickname or contact_id)
-            filename = f"{safe_name}_{timestamp}.txt"
+            filename = self._default_filename(contact, contact_id)
 
         filepath = self.export_dir / filename
 
@@ -48,29 +68,111 @@ class ExportService:
 
         return str(filepath)
 
+    def stream_txt(self, contact_id: str) -> Tuple[str, Iterator[bytes]]:
+        """
+        Export messages for a contact as a stream of UTF-8 encoded chunks.
+
+        The contact is looked up before returning, so a missing contact
+        raises ValueError here rather than midway through a download.
+
+        Returns: (suggested filename, iterator of byte chunks)
+        """
+        contact, messages = self._load_chat(contact_id)
+        filename = self._default_filename(contact, contact_id)
+        return filename, self._iter_txt_chunks(contact, messages)
+
+    def _iter_txt_chunks(
+        self, contact: Contact, messages: List[Message]
+    ) -> Iterator[bytes]:
+        """Yield the TXT export in chunks of about STREAM_CHUNK_SIZE bytes"""
+        buf: List[str] = []
+        size = 0
+        for line in self._txt_lines(contact, messages):
+            buf.append(line)
+            size += len(line)
+            if size >= self.STREAM_CHUNK_SIZE:
+                yield "".join(buf).encode("utf-8")
+                buf.clear()
+                size = 0
+        if buf:
+            yield "".join(buf).encode("utf-8")
+
+    def _load_chat(self, contact_id: str) -> Tuple[Contact, List[Message]]:
+        contact = self.storage.get_contact(contact_id)
+        if not contact:
+            raise ValueError(f"Contact {contact_id} not found")
+        return contact, self.storage.get_messages(contact_id, limit=self.MESSAGE_LIMIT)
+
+    def _default_filename(self, contact: Contact, contact_id: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_name = self._safe_filename(contact.nickname or contact_id)
+        return f"{safe_name}_{timestamp}.txt"
+
     def export_multiple(self, contact_ids: List[str]) -> List[str]:
-        """Export multiple contacts, returns list of file paths"""
-        return [self.export_to_txt(cid) for cid in contact_ids]
+        """Export multiple contacts, returns list of file paths
+
+        All contacts are looked up in one query first, so an unknown id fails
+        the batch before any file is written. A repeated id is exported once
+        and its path is returned for every occurrence.
+        """
+        contacts = self.storage.get_contacts(contact_ids)
+        for cid in contact_ids:
+            if cid not in contacts:
+                raise ValueError(f"Contact {cid} not found")
+
+        # Pick every filename up front so no two exports (possibly running in
+        # parallel) write the same path, even for contacts sharing a nickname
+        unique_ids = list(dict.fromkeys(contact_ids))
+        filenames = {}
+        used = set()
+        for cid in unique_ids:
+            filename = self._default_filename(contacts[cid], cid)
+            stem = filename[: -len(".txt")]
+            n = 1
+            while filename in used:
+                n += 1
+                filename = f"{stem}_{n}.txt"
+            used.add(filename)
+            filenames[cid] = filename
+
+        def export_one(contact_id: str) -> str:
+            messages = self.storage.get_messages(contact_id, limit=self.MESSAGE_LIMIT)
+            return self._write_txt_file(
+                contact_id, contacts[contact_id], messages, filenames[contact_id]
+            )
+
+        if len(unique_ids) <= 2:
+            paths = [export_one(cid) for cid in unique_ids]
+        else:
+            # Each export opens its own SQLite connection and writes its own
+            # file, so contacts can be exported concurrently
+            max_workers = min(len(unique_ids), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                paths = list(executor.map(export_one, unique_ids))
+
+        path_by_id = dict(zip(unique_ids, paths))
+        return [path_by_id[cid] for cid in contact_ids]
 
     def _write_txt_content(self, f, contact: Contact, messages: List[Message]):
         """Write formatted TXT content"""
+        # Build every line first, then encode and write them in one call
+        f.write("".join(self._txt_lines(contact, messages)))
+
+    def _txt_lines(self, contact: Contact, messages: List[Message]) -> Iterator[str]:
+        """Yield the formatted TXT export line by line"""
+        other = contact.nickname or contact.username
         # Header
-        f.write(f"聊天记录导出 - {contact.nickname or contact.username}\n")
-        f.write(f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 50 + "\n\n")
+        yield f"聊天记录导出 - {other}\n"
+        yield f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        yield "=" * 50 + "\n\n"
 
-        # Messages
         for msg in sorted(messages, key=lambda m: m.create_time):
-            time_str = datetime.fromtimestamp(msg.create_time).strftime(
-                "%Y-%m-%d %H:%M:%S"
+            yield (
+                f"[{_fmt_ts(msg.create_time)}] "
+                f"{'我' if msg.is_sender else other}: {msg.content}\n"
             )
-            sender = "我" if msg.is_sender else (contact.nickname or contact.username)
-            f.write(f"[{time_str}] {sender}: {msg.content}\n")
 
     def _safe_filename(self, name: str) -> str:
         """Convert name to safe filename"""
-        # Remove invalid characters
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            name = name.replace(char, "_")
-        return name[:50]  # Limit length
+        # Limit length first; the mapping is one-to-one so the result is the same
+        return name[:50].translate(self._SAFE_FILENAME_TABLE)
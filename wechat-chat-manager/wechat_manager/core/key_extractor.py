@@ -6,8 +6,8 @@ Provides:
 - Manual key setting
 """
 
-import re
-from typing import Optional
+import time
+from typing import Optional, Tuple
 
 import keyring
 
@@ -16,6 +16,11 @@ SERVICE_NAME = "wechat_chat_manager"
 KEY_NAME = "db_key"
 KEY_LENGTH_HEX = 64  # 32 bytes = 64 hex characters
 
+# The UI polls the key status; keyring backends (Credential Manager, Secret
+# Service) are slow to query, so lookups are cached for a short time.
+_KEY_CACHE_TTL = 1.0
+_key_cache: Optional[Tuple[float, Optional[str]]] = None
+
 
 class InvalidKeyError(Exception):
     """Raised when key format is invalid."""
@@ -24,11 +29,13 @@ class InvalidKeyError(Exception):
 
 
 def _is_valid_hex_key(key: Optional[str]) -> bool:
-    if key is None:
+    if not isinstance(key, str) or len(key) != KEY_LENGTH_HEX:
         return False
-    if len(key) != KEY_LENGTH_HEX:
+    try:
+        # fromhex skips whitespace, so also check the decoded length
+        return len(bytes.fromhex(key)) == KEY_LENGTH_HEX // 2
+    except ValueError:
         return False
-    return bool(re.fullmatch(r"[0-9a-fA-F]+", key))
 
 
 def validate_key(key: Optional[str], db_path: str) -> bool:
@@ -56,21 +63,39 @@ def validate_key(key: Optional[str], db_path: str) -> bool:
 def save_key_to_keyring(key: str) -> None:
     """Save key to system keyring securely."""
 
+    global _key_cache
+
     keyring.set_password(SERVICE_NAME, KEY_NAME, key)
+    _key_cache = (time.monotonic(), key)
 
 
 def get_key_from_keyring() -> Optional[str]:
-    """Retrieve key from system keyring."""
+    """Retrieve key from system keyring (cached for _KEY_CACHE_TTL seconds)."""
+
+    global _key_cache
+
+    now = time.monotonic()
+    if _key_cache is not None and now - _key_cache[0] < _KEY_CACHE_TTL:
+        return _key_cache[1]
 
-    return keyring.get_password(SERVICE_NAME, KEY_NAME)
+    key = keyring.get_password(SERVICE_NAME, KEY_NAME)
+    _key_cache = (now, key)
+    return key
+
+
+def _reset_key_cache() -> None:
+    """Forget the cached keyring lookup."""
+
+    global _key_cache
+    _key_cache = None
 
 
 def set_manual_key(key: str) -> bool:
     """Manually set a key after validating its format."""
 
-    if not _is_valid_hex_key(key):
+    normalized_key = key.lower() if isinstance(key, str) else key
+    if not _is_valid_hex_key(normalized_key):
         raise InvalidKeyError(f"Key must be {KEY_LENGTH_HEX} hexadecimal characters")
 
-    normalized_key = key.lower()
     save_key_to_keyring(normalized_key)
     return True
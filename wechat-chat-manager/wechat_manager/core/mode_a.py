@@ -5,7 +5,9 @@ Provides safe extraction of WeChat chat data to encrypted local storage.
 Source databases are NEVER modified - this mode is purely read-only.
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List, Optional
+import os
 import time
 
 from wechat_manager.core.db_handler import WeChatDBHandler
@@ -62,16 +64,20 @@ class ModeA:
                     break
 
             if contact is None:
-                return {
-                    "contact_id": contact_id,
-                    "message_count": 0,
-                    "success": False,
-                    "error": f"Contact {contact_id} not found in WeChat database",
-                }
+                return self._not_found_result(contact_id)
 
             # 2. Get all messages for contact (use high limit to get all)
             messages = self.db_handler.get_messages(contact_id, limit=100000)
 
+            return self._store_extracted(contact, messages)
+
+        except Exception as e:
+            return self._error_result(contact_id, e)
+
+    def _store_extracted(self, contact: Contact, messages: List[Message]) -> dict:
+        """Store a contact and its messages read from the WeChat DB"""
+        contact_id = contact.id
+        try:
             # 3. Store contact in encrypted storage
             # Set hidden_at to current timestamp
             contact.hidden_at = int(time.time())
@@ -100,26 +106,89 @@ class ModeA:
             }
 
         except Exception as e:
-            return {
-                "contact_id": contact_id,
-                "message_count": 0,
-                "success": False,
-                "error": str(e),
-            }
+            return self._error_result(contact_id, e)
+
+    @staticmethod
+    def _not_found_result(contact_id: str) -> dict:
+        return {
+            "contact_id": contact_id,
+            "message_count": 0,
+            "success": False,
+            "error": f"Contact {contact_id} not found in WeChat database",
+        }
+
+    @staticmethod
+    def _error_result(contact_id: str, error: Exception) -> dict:
+        return {
+            "contact_id": contact_id,
+            "message_count": 0,
+            "success": False,
+            "error": str(error),
+        }
 
     def extract_multiple(self, contact_ids: List[str]) -> List[dict]:
         """Extract messages for multiple contacts.
 
+        The contact list is read once, and the per-contact message reads run
+        concurrently (each opens its own read-only connection). At most
+        ``max_workers`` reads are in flight, and each finished read is stored
+        right away, so only a few contacts' messages are held in memory at a
+        time. Writes to encrypted storage stay in this thread so they never
+        wait on each other's write lock.
+
         Args:
             contact_ids: List of contact IDs to extract
 
         Returns:
             List of result dicts, one for each contact
         """
-        results = []
-        for contact_id in contact_ids:
-            result = self.extract_contact(contact_id)
-            results.append(result)
+        if len(contact_ids) <= 1:
+            return [self.extract_contact(cid) for cid in contact_ids]
+
+        try:
+            contacts = {c.id: c for c in self.db_handler.get_contacts()}
+        except Exception as e:
+            return [self._error_result(cid, e) for cid in contact_ids]
+
+        results: List[Optional[dict]] = [None] * len(contact_ids)
+        pending_reads = []
+        for index, contact_id in enumerate(contact_ids):
+            if contact_id in contacts:
+                pending_reads.append(index)
+            else:
+                results[index] = self._not_found_result(contact_id)
+
+        def read_messages(contact_id: str) -> List[Message]:
+            return self.db_handler.get_messages(contact_id, limit=100000)
+
+        max_workers = min(len(contact_ids), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            queued = iter(pending_reads)
+            in_flight = {}
+
+            def submit_next() -> None:
+                index = next(queued, None)
+                if index is not None:
+                    future = executor.submit(read_messages, contact_ids[index])
+                    in_flight[future] = index
+
+            for _ in range(max_workers):
+                submit_next()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    contact_id = contact_ids[index]
+                    try:
+                        messages = future.result()
+                    except Exception as e:
+                        results[index] = self._error_result(contact_id, e)
+                    else:
+                        results[index] = self._store_extracted(
+                            contacts[contact_id], messages
+                        )
+                    # Refill the window only once a read has been stored
+                    submit_next()
         return results
 
     def sync_contact(self, contact_id: str) -> dict:
@@ -37,48 +37,37 @@ class SearchService:
         Returns:
             List of matching Message objects, ordered by create_time ASC
         """
-        conn = self.storage._get_connection()
+        where, params = self.storage._content_filter(query)
+        conn = self.storage._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
 
             if contact_id:
                 # Search within specific contact
                 cursor.execute(
-                    """
+                    f"""
                     SELECT id, contact_id, original_id, content, create_time, is_sender, msg_type
                     FROM messages
-                    WHERE content LIKE ? AND contact_id = ?
+                    WHERE {where} AND contact_id = ?
                     ORDER BY create_time ASC
                     LIMIT ?
                     """,
-                    (f"%{query}%", contact_id, limit),
+                    (*params, contact_id, limit),
                 )
             else:
                 # Global search across all messages
                 cursor.execute(
-                    """
+                    f"""
                     SELECT id, contact_id, original_id, content, create_time, is_sender, msg_type
                     FROM messages
-                    WHERE content LIKE ?
+                    WHERE {where}
                     ORDER BY create_time ASC
                     LIMIT ?
                     """,
-                    (f"%{query}%", limit),
+                    (*params, limit),
                 )
 
-            rows = cursor.fetchall()
-            return [
-                Message(
-                    id=row[0],
-                    contact_id=row[1],
-                    original_id=row[2],
-                    content=row[3],
-                    create_time=row[4],
-                    is_sender=bool(row[5]),
-                    msg_type=row[6],
-                )
-                for row in rows
-            ]
+            return [self._row_to_message(row) for row in cursor.fetchall()]
         finally:
             conn.close()
 
@@ -107,11 +96,12 @@ class SearchService:
 
         results = []
 
-        for match in matches:
-            conn = self.storage._get_connection()
-            try:
-                cursor = conn.cursor()
-
+        # One connection for every match; each context query is a seek on
+        # the (contact_id, create_time) index
+        conn = self.storage._get_connection(read_only=True)
+        try:
+            cursor = conn.cursor()
+            for match in matches:
                 # Get messages before
                 cursor.execute(
                     """
@@ -124,18 +114,6 @@ class SearchService:
                     (match.contact_id, match.create_time, context_lines),
                 )
                 before_rows = list(reversed(cursor.fetchall()))
-                before_messages = [
-                    Message(
-                        id=row[0],
-                        contact_id=row[1],
-                        original_id=row[2],
-                        content=row[3],
-                        create_time=row[4],
-                        is_sender=bool(row[5]),
-                        msg_type=row[6],
-                    )
-                    for row in before_rows
-                ]
 
                 # Get messages after
                 cursor.execute(
@@ -149,27 +127,27 @@ class SearchService:
                     (match.contact_id, match.create_time, context_lines),
                 )
                 after_rows = cursor.fetchall()
-                after_messages = [
-                    Message(
-                        id=row[0],
-                        contact_id=row[1],
-                        original_id=row[2],
-                        content=row[3],
-                        create_time=row[4],
-                        is_sender=bool(row[5]),
-                        msg_type=row[6],
-                    )
-                    for row in after_rows
-                ]
 
                 results.append(
                     {
                         "match": match,
-                        "before": before_messages,
-                        "after": after_messages,
+                        "before": [self._row_to_message(row) for row in before_rows],
+                        "after": [self._row_to_message(row) for row in after_rows],
                     }
                 )
-            finally:
-                conn.close()
+        finally:
+            conn.close()
 
         return results
+
+    @staticmethod
+    def _row_to_message(row: tuple) -> Message:
+        return Message(
+            id=row[0],
+            contact_id=row[1],
+            original_id=row[2],
+            content=row[3],
+            create_time=row[4],
+            is_sender=bool(row[5]),
+            msg_type=row[6],
+        )
@@ -5,8 +5,10 @@ Uses PBKDF2 key derivation and SQLite for storage.
 For MVP, uses standard sqlite3 - production should use sqlcipher3.
 """
 
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import sqlite3
 import os
 
@@ -16,14 +18,32 @@ from Crypto.Hash import SHA256
 from wechat_manager.models.chat import Contact, Message
 
 
+@lru_cache(maxsize=32)
+def _pbkdf2_sha256(password: str, salt: bytes, count: int, dk_len: int) -> bytes:
+    """PBKDF2-HMAC-SHA256, memoized per process on all KDF inputs"""
+    return PBKDF2(password, salt, dkLen=dk_len, count=count, hmac_hash_module=SHA256)
+
+
 class EncryptedStorage:
     PBKDF2_ITERATIONS = 100000
     KEY_LENGTH = 32
 
-    def __init__(self, storage_path: str, password: str):
+    def __init__(
+        self, storage_path: str, password: str, key: Optional[bytes] = None
+    ):
         self.storage_path = Path(storage_path)
         self.db_path = self.storage_path / "hidden_chats.db"
-        self._key = self._derive_key(password)
+        if key is not None:
+            # A caller that already derived the key for this salt skips
+            # PBKDF2. The salt must already be on disk, or the directory could
+            # never be reopened with the password alone.
+            if not (self.storage_path / ".salt").is_file():
+                raise ValueError(
+                    "A pre-derived key needs the storage's existing .salt file"
+                )
+            self._key = key
+        else:
+            self._key = self._derive_key(password)
         self._ensure_storage_exists()
 
     def _derive_key(self, password: str) -> bytes:
@@ -34,12 +54,8 @@ class EncryptedStorage:
             salt = os.urandom(16)
             self.storage_path.mkdir(parents=True, exist_ok=True)
             salt_path.write_bytes(salt)
-        return PBKDF2(
-            password,
-            salt,
-            dkLen=self.KEY_LENGTH,
-            count=self.PBKDF2_ITERATIONS,
-            hmac_hash_module=SHA256,
+        return _pbkdf2_sha256(
+            password, salt, self.PBKDF2_ITERATIONS, self.KEY_LENGTH
         )
 
     def _ensure_storage_exists(self):
@@ -47,6 +63,8 @@ class EncryptedStorage:
         conn = sqlite3.connect(str(self.db_path))
         try:
             cursor = conn.cursor()
+            # WAL is persistent in the database file; readers no longer block writers
+            cursor.execute("PRAGMA journal_mode=WAL")
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS contacts (
                     id TEXT PRIMARY KEY,
@@ -94,10 +112,72 @@ class EncryptedStorage:
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_messages_time ON messages(create_time)
             """)
+            # Serves per-contact time-ordered reads (history pages, search context)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_contact_time
+                ON messages(contact_id, create_time)
+            """)
+            self._has_fts = self._ensure_fts(cursor)
             conn.commit()
         finally:
             conn.close()
 
+    # The trigram tokenizer can only use its index for 3+ character patterns
+    FTS_MIN_QUERY_LENGTH = 3
+
+    @staticmethod
+    def _ensure_fts(cursor: sqlite3.Cursor) -> bool:
+        """Create the trigram FTS5 index over message content if supported"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE messages_fts USING fts5(
+                    content, content='messages', content_rowid='id', tokenize='trigram'
+                )
+            """)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 or older than 3.34 (no trigram)
+            return False
+        cursor.execute("""
+            CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        # Index rows stored before the FTS table existed
+        cursor.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        return True
+
+    def _content_filter(self, query: str) -> Tuple[str, tuple]:
+        """WHERE clause for a case-insensitive substring match on content
+
+        Uses the trigram index when the query is long enough, otherwise a
+        plain LIKE scan; both have identical LIKE semantics.
+        """
+        pattern = f"%{query}%"
+        if self._has_fts and len(query) >= self.FTS_MIN_QUERY_LENGTH:
+            return (
+                "id IN (SELECT rowid FROM messages_fts WHERE content LIKE ?)",
+                (pattern,),
+            )
+        return "content LIKE ?", (pattern,)
+
     @staticmethod
     def _is_msgsource_xml(text: str) -> bool:
         lower = (text or "").lstrip().lower()
@@ -114,8 +194,65 @@ class EncryptedStorage:
             return True
         return False
 
-    def _get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(str(self.db_path))
+    def data_fingerprint(self) -> tuple:
+        """(size, mtime) of the database and its WAL; changes on every commit"""
+        wal_path = self.db_path.with_name(self.db_path.name + "-wal")
+        fingerprint = []
+        for path in (self.db_path, wal_path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                fingerprint.append(None)
+                continue
+            # Read-only connections leave an empty WAL behind; that is no change
+            fingerprint.append((st.st_size, st.st_mtime_ns) if st.st_size else None)
+        return (str(self.db_path), tuple(fingerprint))
+
+    # Per-connection tuning: 64 MiB page cache, temp b-trees in memory and
+    # up to 256 MiB of the file memory-mapped for search scans
+    _CONNECTION_PRAGMAS = (
+        "synchronous=NORMAL",
+        "cache_size=-65536",
+        "temp_store=MEMORY",
+        "mmap_size=268435456",
+    )
+
+    def _get_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            # Read-only handles never take the write lock, so under WAL they
+            # run alongside an in-progress extract/sync without blocking
+            uri = self.db_path.resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, cached_statements=256)
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn = sqlite3.connect(str(self.db_path), cached_statements=256)
+        # synchronous=NORMAL is safe with WAL: a crash can only lose the last
+        # commits, never corrupt
+        for pragma in self._CONNECTION_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
+
+    # Keep IN (...) lists below SQLite's default host parameter limit
+    _LOOKUP_CHUNK = 500
+
+    def _existing_messages(
+        self, cursor: sqlite3.Cursor, contact_id: str, original_ids: List[int]
+    ) -> dict:
+        """Map original_id -> (id, content) for already stored messages"""
+        existing = {}
+        for start in range(0, len(original_ids), self._LOOKUP_CHUNK):
+            chunk = original_ids[start : start + self._LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = cursor.execute(
+                f"""
+                SELECT original_id, id, content FROM messages
+                WHERE contact_id = ? AND original_id IN ({placeholders})
+                """,
+                (contact_id, *chunk),
+            )
+            for original_id, msg_id, content in rows:
+                existing[original_id] = (msg_id, content or "")
+        return existing
 
     def store_contact(self, contact: Contact) -> bool:
         conn = self._get_connection()
@@ -142,59 +279,23 @@ class EncryptedStorage:
         finally:
             conn.close()
 
-    def store_messages(self, contact_id: str, messages: List[Message]) -> int:
-        if not messages:
+    # Messages upserted per round of existing-row lookup + executemany; input
+    # is consumed this many at a time, so any iterable streams in
+    _STORE_CHUNK = 1000
+
+    def store_messages(self, contact_id: str, messages: Iterable[Message]) -> int:
+        batches = self._message_chunks(messages)
+        first = next(batches, None)
+        if first is None:
             return 0
         conn = self._get_connection()
         try:
             cursor = conn.cursor()
-            count = 0
-            for msg in messages:
-                new_content = msg.content or ""
-                if msg.original_id is not None:
-                    row = cursor.execute(
-                        """
-                        SELECT id, content FROM messages
-                        WHERE contact_id = ? AND original_id = ?
-                        """,
-                        (contact_id, msg.original_id),
-                    ).fetchone()
-                    if row is not None:
-                        old_id, old_content = row[0], row[1] or ""
-                        if self._should_replace_content(old_content, new_content):
-                            cursor.execute(
-                                """
-                                UPDATE messages
-                                SET content = ?, create_time = ?, is_sender = ?, msg_type = ?
-                                WHERE id = ?
-                                """,
-                                (
-                                    new_content,
-                                    msg.create_time,
-                                    1 if msg.is_sender else 0,
-                                    msg.msg_type,
-                                    old_id,
-                                ),
-                            )
-                            count += cursor.rowcount
-                        continue
-
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO messages
-                    (contact_id, original_id, content, create_time, is_sender, msg_type)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        contact_id,
-                        msg.original_id,
-                        new_content,
-                        msg.create_time,
-                        1 if msg.is_sender else 0,
-                        msg.msg_type,
-                    ),
-                )
-                count += cursor.rowcount
+            # All chunks share one transaction; rows inserted by an earlier
+            # chunk are seen by the next chunk's existing-row lookup
+            count = self._store_message_chunk(cursor, contact_id, first)
+            for chunk in batches:
+                count += self._store_message_chunk(cursor, contact_id, chunk)
             conn.commit()
             return count
         except sqlite3.Error:
@@ -202,8 +303,73 @@ class EncryptedStorage:
         finally:
             conn.close()
 
+    def _message_chunks(self, messages: Iterable[Message]) -> Iterator[List[Message]]:
+        it = iter(messages)
+        while chunk := list(islice(it, self._STORE_CHUNK)):
+            yield chunk
+
+    def _store_message_chunk(
+        self, cursor: sqlite3.Cursor, contact_id: str, messages: List[Message]
+    ) -> int:
+        original_ids = list(
+            {msg.original_id for msg in messages if msg.original_id is not None}
+        )
+        # original_id -> (row id, content); row id is None while the row
+        # is still pending in `inserts` (duplicate within this chunk)
+        existing = self._existing_messages(cursor, contact_id, original_ids)
+        pending = {}
+        inserts = []
+        updates = []
+        count = 0
+        for msg in messages:
+            new_content = msg.content or ""
+            row = (
+                new_content,
+                msg.create_time,
+                1 if msg.is_sender else 0,
+                msg.msg_type,
+            )
+            if msg.original_id is not None:
+                if msg.original_id in existing:
+                    old_id, old_content = existing[msg.original_id]
+                    if self._should_replace_content(old_content, new_content):
+                        if old_id is None:
+                            index = pending[msg.original_id]
+                            inserts[index] = inserts[index][:2] + row
+                            count += 1
+                        else:
+                            updates.append(row + (old_id,))
+                        existing[msg.original_id] = (old_id, new_content)
+                    continue
+                existing[msg.original_id] = (None, new_content)
+                pending[msg.original_id] = len(inserts)
+
+            inserts.append((contact_id, msg.original_id) + row)
+
+        if updates:
+            cursor.executemany(
+                """
+                UPDATE messages
+                SET content = ?, create_time = ?, is_sender = ?, msg_type = ?
+                WHERE id = ?
+                """,
+                updates,
+            )
+            count += cursor.rowcount
+        if inserts:
+            cursor.executemany(
+                """
+                INSERT OR IGNORE INTO messages
+                (contact_id, original_id, content, create_time, is_sender, msg_type)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                inserts,
+            )
+            count += cursor.rowcount
+        return count
+
     def get_contact(self, contact_id: str) -> Optional[Contact]:
-        conn = self._get_connection()
+        conn = self._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -215,20 +381,46 @@ class EncryptedStorage:
             )
             row = cursor.fetchone()
             if row:
-                return Contact(
-                    id=row[0],
-                    username=row[1],
-                    nickname=row[2],
-                    remark=row[3],
-                    contact_type=row[4],
-                    hidden_at=row[5],
-                )
+                return self._row_to_contact(row)
             return None
         finally:
             conn.close()
 
+    def get_contacts(self, contact_ids: Iterable[str]) -> Dict[str, Contact]:
+        """Look up several contacts at once; missing ids are simply absent"""
+        ids = list(dict.fromkeys(contact_ids))
+        conn = self._get_connection(read_only=True)
+        try:
+            found: Dict[str, Contact] = {}
+            for start in range(0, len(ids), self._LOOKUP_CHUNK):
+                chunk = ids[start : start + self._LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"""
+                    SELECT id, username, nickname, remark, contact_type, hidden_at
+                    FROM contacts WHERE id IN ({placeholders})
+                    """,
+                    chunk,
+                )
+                for row in rows:
+                    found[row[0]] = self._row_to_contact(row)
+            return found
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_contact(row: tuple) -> Contact:
+        return Contact(
+            id=row[0],
+            username=row[1],
+            nickname=row[2],
+            remark=row[3],
+            contact_type=row[4],
+            hidden_at=row[5],
+        )
+
     def get_messages(self, contact_id: str, limit: int = 100) -> List[Message]:
-        conn = self._get_connection()
+        conn = self._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -258,7 +450,7 @@ class EncryptedStorage:
             conn.close()
 
     def list_contacts(self) -> List[Contact]:
-        conn = self._get_connection()
+        conn = self._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
             cursor.execute("""
@@ -267,22 +459,12 @@ class EncryptedStorage:
                 ORDER BY hidden_at DESC
             """)
             rows = cursor.fetchall()
-            return [
-                Contact(
-                    id=row[0],
-                    username=row[1],
-                    nickname=row[2],
-                    remark=row[3],
-                    contact_type=row[4],
-                    hidden_at=row[5],
-                )
-                for row in rows
-            ]
+            return [self._row_to_contact(row) for row in rows]
         finally:
             conn.close()
 
     def get_latest_message_time(self, contact_id: str) -> int:
-        conn = self._get_connection()
+        conn = self._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -323,17 +505,18 @@ class EncryptedStorage:
             conn.close()
 
     def search_messages(self, query: str) -> List[Message]:
-        conn = self._get_connection()
+        where, params = self._content_filter(query)
+        conn = self._get_connection(read_only=True)
         try:
             cursor = conn.cursor()
             cursor.execute(
-                """
+                f"""
                 SELECT id, contact_id, original_id, content, create_time, is_sender, msg_type
                 FROM messages
-                WHERE content LIKE ?
+                WHERE {where}
                 ORDER BY create_time ASC
             """,
-                (f"%{query}%",),
+                params,
             )
             rows = cursor.fetchall()
             return [
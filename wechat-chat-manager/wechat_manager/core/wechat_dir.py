@@ -8,8 +8,10 @@ Supported layouts:
 """
 
 import os
+import stat
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, Optional, List
 
 # Default search paths for WeChat data directory (Windows)
 DEFAULT_PATHS = [
@@ -32,22 +34,60 @@ def auto_detect_wechat_dir() -> Optional[str]:
     Automatically detect WeChat Files directory.
 
     Searches through DEFAULT_PATHS and returns the first valid directory found.
+    The result is memoized; a remembered directory that no longer exists is
+    detected again. Call ``auto_detect_wechat_dir.cache_clear()`` to probe the
+    filesystem again.
 
     Returns:
         Optional[str]: Path to WeChat Files directory if found, None otherwise
     """
+    detected = _detect_wechat_dir()
+    if detected is not None and not os.path.isdir(detected):
+        # Moved or deleted since it was found
+        _detect_wechat_dir.cache_clear()
+        detected = _detect_wechat_dir()
+    return detected
+
+
+@lru_cache(maxsize=1)
+def _detect_wechat_dir() -> Optional[str]:
+    seen = set()
     for path in DEFAULT_PATHS:
         expanded = os.path.expandvars(os.path.expanduser(path))
+        # Several defaults expand to the same place on a given platform
+        if expanded in seen:
+            continue
+        seen.add(expanded)
         if validate_wechat_dir(expanded):
             return expanded
     return None
 
 
+auto_detect_wechat_dir.cache_clear = _detect_wechat_dir.cache_clear
+
+
 def _is_nonempty_file(p: Path) -> bool:
     try:
-        return p.is_file() and p.stat().st_size > 0
+        st = os.stat(p)
     except OSError:
         return False
+    return stat.S_ISREG(st.st_mode) and st.st_size > 0
+
+
+def _iter_wxid_dirs(root: Path) -> Iterator[Path]:
+    """Yield wxid_* subdirectories of root, using scandir's cached file type"""
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if not entry.name.startswith("wxid_"):
+                    continue
+                try:
+                    if entry.is_dir():
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        return
 
 
 def is_v3_wxid_dir(wxid_dir: Path) -> bool:
@@ -101,12 +141,11 @@ def validate_wechat_dir(path: str) -> bool:
     if p.is_dir() and p.name.startswith("wxid_"):
         return is_v3_wxid_dir(p) or is_v4_wxid_dir(p)
 
-    # Root folder containing wxid_* subfolders
-    for wxid_dir in p.glob("wxid_*"):
-        if wxid_dir.is_dir() and (is_v3_wxid_dir(wxid_dir) or is_v4_wxid_dir(wxid_dir)):
-            return True
-
-    return False
+    # Root folder containing wxid_* subfolders; stop at the first valid one
+    return any(
+        is_v3_wxid_dir(wxid_dir) or is_v4_wxid_dir(wxid_dir)
+        for wxid_dir in _iter_wxid_dirs(p)
+    )
 
 
 def set_wechat_dir(path: str) -> bool:
@@ -168,12 +207,11 @@ def get_wxid_folders(wechat_dir: str) -> List[str]:
     if not p.exists():
         return []
 
-    wxid_folders: List[str] = []
-    for folder in p.glob("wxid_*"):
-        if not folder.is_dir():
-            continue
-        if is_v3_wxid_dir(folder) or is_v4_wxid_dir(folder):
-            wxid_folders.append(str(folder))
+    wxid_folders: List[str] = [
+        str(folder)
+        for folder in _iter_wxid_dirs(p)
+        if is_v3_wxid_dir(folder) or is_v4_wxid_dir(folder)
+    ]
 
     wxid_folders.sort()
     return wxid_folders